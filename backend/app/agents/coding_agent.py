@@ -1,29 +1,27 @@
 """
 Coding Agent for assigning GL accounts and cost centers.
 """
-from typing import List, Dict, Any
-from langchain_openai import AzureChatOpenAI
+import json
+import re
+from typing import List, Dict, Any, Optional, Tuple
+from langchain_core.language_models import BaseChatModel
 from langchain.prompts import ChatPromptTemplate
 
 from app.core.config import settings
 from app.agents.state import InvoiceProcessingState
+from app.agents.coding_index import CodingIndex, supplier_key, line_item_signature
+from app.agents.llm_cache import cached_invoke, report_usage, separate_usage
+from app.agents.llm_client import LLMUnavailableError, get_chat_model
+from app.agents.micro_batcher import MicroBatcher
 
+GL_ACCOUNTS = {"5000", "5100", "5200", "5300", "5400", "5500", "5600", "5700", "6000"}
+COST_CENTERS = {"CC-100", "CC-200", "CC-300", "CC-400", "CC-500", "CC-600"}
 
-class CodingAgent:
-    """Agent responsible for accounting coding using AI."""
+# Batch result of an invoice the batched answer did not cover
+NOT_IN_BATCH = object()
 
-    def __init__(self):
-        """Initialize coding agent."""
-        self.llm = AzureChatOpenAI(
-            azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-            api_key=settings.AZURE_OPENAI_API_KEY,
-            deployment_name=settings.AZURE_OPENAI_DEPLOYMENT,
-            api_version=settings.AZURE_OPENAI_API_VERSION,
-            temperature=0.1,
-        )
-
-        self.coding_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an expert accounting AI that assigns General Ledger (GL) accounts
+# Chart of accounts and task, shared by the single and the batched prompt
+CODING_INSTRUCTIONS = """You are an expert accounting AI that assigns General Ledger (GL) accounts
             and cost centers to invoice line items.
 
             Use the following chart of accounts:
@@ -46,17 +44,89 @@ class CodingAgent:
             - CC-600: General & Administrative
 
             Based on the supplier name and line items, assign the most appropriate
-            GL account and cost center. Return your reasoning."""),
+            GL account and cost center.
+
+            """
+
+
+def _split_usage(prompt_tokens: int, completion_tokens: int, parts: int) -> List[Dict[str, int]]:
+    """Split the token usage of a call into `parts` near-equal shares that add up to it."""
+    shares = []
+    for index in range(parts):
+        prompt = prompt_tokens // parts + (1 if index < prompt_tokens % parts else 0)
+        completion = completion_tokens // parts + (1 if index < completion_tokens % parts else 0)
+        shares.append({
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": prompt + completion,
+        })
+    return shares
+
+
+class CodingAgent:
+    """Agent responsible for accounting coding using AI."""
+
+    def __init__(self, llm: Optional[BaseChatModel] = None):
+        """
+        Initialize coding agent.
+
+        Args:
+            llm: Chat model to use instead of the shared Azure OpenAI client
+        """
+        self.llm = llm if llm is not None else get_chat_model(temperature=0.1)
+
+        self.coding_prompt = ChatPromptTemplate.from_messages([
+            ("system", CODING_INSTRUCTIONS + """Return ONLY valid JSON of the form:
+            {{"gl_account": "5000", "cost_center": "CC-100", "reasoning": "..."}}"""),
             ("user", """Supplier: {supplier_name}
             Line Items: {line_items}
 
             Assign GL account and cost center with reasoning.""")
         ])
 
+        # Several invoices coded in one call, sharing the instructions
+        self.batch_prompt = ChatPromptTemplate.from_messages([
+            ("system", CODING_INSTRUCTIONS + """You will receive several invoices, each
+            introduced by its number. Return ONLY valid JSON of the form:
+            {{"codings": [{{"invoice": 1, "gl_account": "5000", "cost_center": "CC-100"}}]}}
+            with exactly one entry per invoice."""),
+            ("user", """Assign GL account and cost center to each of these {count} invoices:
+
+            {invoices}""")
+        ])
+
+        # Concurrent codings are collected briefly and sent together
+        self.batcher = MicroBatcher(
+            self._code_batch,
+            max_size=settings.CODING_BATCH_MAX_SIZE,
+            window_seconds=settings.CODING_BATCH_WINDOW_SECONDS,
+        ) if settings.CODING_BATCH_ENABLED else None
+
+        # Codings learned from past invoices, used before asking the LLM
+        self.coding_index = CodingIndex(
+            min_confidence=settings.CODING_INDEX_MIN_CONFIDENCE,
+            min_occurrences=settings.CODING_INDEX_MIN_OCCURRENCES,
+        ) if settings.CODING_INDEX_ENABLED else None
+
     def process(self, state: InvoiceProcessingState) -> InvoiceProcessingState:
         """
         Assign GL accounts and cost centers using AI.
 
+        Args:
+            state: Current processing state
+
+        Returns:
+            Updated state with accounting codes
+        """
+        state = self.code(state)
+        self.remember(state)
+        return state
+
+    def code(self, state: InvoiceProcessingState) -> InvoiceProcessingState:
+        """
+        Assign GL accounts and cost centers without recording them in the
+        coding index, so a speculative coding can still be discarded.
+
         Args:
             state: Current processing state
 
@@ -64,22 +134,42 @@ class CodingAgent:
             Updated state with accounting codes
         """
         try:
-            supplier_name = state.get("supplier_name", "Unknown")
-            line_items = state.get("line_items", [])
+            supplier_name = state.get("supplier_name") or "Unknown"
+            line_items = state.get("line_items") or []
 
-            # Use AI to determine appropriate coding
-            chain = self.coding_prompt | self.llm
-            response = chain.invoke({
-                "supplier_name": supplier_name,
-                "line_items": str(line_items)
-            })
+            key = supplier_key(state.get("supplier_tax_id"), state.get("supplier_name"))
+            signature = line_item_signature(line_items)
+
+            # Known supplier and items: reuse the historical coding
+            match = self.coding_index.lookup(key, signature) if self.coding_index else None
 
-            # Parse AI response and assign codes
-            # For demo, use simple logic
-            gl_account, cost_center = self._determine_coding(supplier_name, line_items)
+            if match:
+                gl_account, cost_center, confidence = match
+                coding_source = "index"
+
+            else:
+                # Use AI to determine appropriate coding
+                try:
+                    parsed = self._llm_coding(supplier_name, line_items)
+                except LLMUnavailableError as e:
+                    # Degrade to keyword rules; the error keeps the result out of the cache
+                    state["processing_errors"].append(f"Coding fell back to rules: {str(e)}")
+                    parsed = None
+
+                if parsed:
+                    gl_account, cost_center = parsed
+                    confidence = None
+                    coding_source = "llm"
+                else:
+                    # Unusable answer, fall back to keyword rules
+                    gl_account, cost_center = self._determine_coding(supplier_name, line_items)
+                    confidence = None
+                    coding_source = "rules"
 
             state["gl_account"] = gl_account
             state["cost_center"] = cost_center
+            state["coding_source"] = coding_source
+            state["coding_confidence"] = confidence
 
             # Create accounting entries
             state["accounting_entries"] = self._create_accounting_entries(state)
@@ -92,6 +182,123 @@ class CodingAgent:
 
         return state
 
+    def remember(self, state: InvoiceProcessingState) -> None:
+        """Record an LLM-assigned coding in the coding index."""
+        if self.coding_index is None or state.get("coding_source") != "llm":
+            return
+
+        self.coding_index.record(
+            supplier_key(state.get("supplier_tax_id"), state.get("supplier_name")),
+            line_item_signature(state.get("line_items") or []),
+            state["gl_account"],
+            state["cost_center"],
+        )
+
+    def _llm_coding(self, supplier_name: str, line_items: List[Dict]) -> Optional[Tuple[str, str]]:
+        """
+        Ask the LLM for a coding, batched with concurrent invoices if enabled.
+
+        Returns:
+            Tuple of (gl_account, cost_center), or None if the answer is unusable
+        """
+        if self.batcher is not None:
+            parsed, usage = self.batcher.submit((supplier_name, line_items))
+            # The batch call ran in whichever thread sent it; count this invoice's share here
+            if usage["total_tokens"]:
+                report_usage(self.llm, usage)
+            if parsed is not NOT_IN_BATCH:
+                return parsed
+
+        # Alone, or left out of the batched answer
+        content = cached_invoke(self.coding_prompt, self.llm, {
+            "supplier_name": supplier_name,
+            "line_items": str(line_items)
+        })
+        return self._parse_coding(content)
+
+    def _code_batch(self, requests: List[Tuple[str, List[Dict]]]) -> List[Tuple[Any, Dict[str, int]]]:
+        """
+        Code a batch of (supplier_name, line_items) requests in one LLM call.
+
+        Returns:
+            Per request, a tuple of the coding and its share of the call's
+            token usage. The coding is a (gl_account, cost_center) tuple, None
+            if the answer is unusable, or NOT_IN_BATCH if the batched answer
+            left it out
+        """
+        # Kept out of the sending thread's own accounting, and split below
+        with separate_usage() as usage:
+            results = self._code_requests(requests)
+
+        shares = _split_usage(usage.prompt_tokens, usage.completion_tokens, len(requests))
+        return list(zip(results, shares))
+
+    def _code_requests(self, requests: List[Tuple[str, List[Dict]]]) -> List[Any]:
+        """Codings of a batch of requests, as described in `_code_batch`."""
+        if len(requests) == 1:
+            supplier_name, line_items = requests[0]
+            content = cached_invoke(self.coding_prompt, self.llm, {
+                "supplier_name": supplier_name,
+                "line_items": str(line_items)
+            })
+            return [self._parse_coding(content)]
+
+        invoices = "\n\n".join(
+            f"Invoice {number}:\nSupplier: {supplier_name}\nLine Items: {line_items}"
+            for number, (supplier_name, line_items) in enumerate(requests, start=1)
+        )
+        content = cached_invoke(self.batch_prompt, self.llm, {"count": len(requests), "invoices": invoices})
+
+        data = self._parse_json(content)
+        codings = data.get("codings") if isinstance(data, dict) else None
+        results: List[Any] = [NOT_IN_BATCH] * len(requests)
+
+        for entry in codings if isinstance(codings, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                index = int(entry.get("invoice")) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= index < len(requests):
+                coding = self._valid_coding(entry)
+                if coding is not None:
+                    results[index] = coding
+
+        return results
+
+    def _parse_coding(self, content: str) -> Optional[Tuple[str, str]]:
+        """
+        Parse the LLM coding answer.
+
+        Returns:
+            Tuple of (gl_account, cost_center), or None if the answer is not
+            valid JSON or uses codes outside the chart of accounts
+        """
+        data = self._parse_json(content)
+        return self._valid_coding(data) if isinstance(data, dict) else None
+
+    def _parse_json(self, content: str) -> Any:
+        """Parse the outermost JSON object of an answer, or None."""
+        match = re.search(r"\{.*\}", content or "", re.DOTALL)
+        if not match:
+            return None
+
+        try:
+            return json.loads(match.group(0))
+        except json.JSONDecodeError:
+            return None
+
+    def _valid_coding(self, data: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """The (gl_account, cost_center) of an answer, if both are in the chart of accounts."""
+        gl_account = str(data.get("gl_account") or "").strip()
+        cost_center = str(data.get("cost_center") or "").strip().upper()
+
+        if gl_account not in GL_ACCOUNTS or cost_center not in COST_CENTERS:
+            return None
+
+        return gl_account, cost_center
+
     def _determine_coding(self, supplier_name: str, line_items: List[Dict]) -> tuple:
         """
         Determine GL account and cost center.
@@ -0,0 +1,220 @@
+"""
+Historical coding index for the Coding Agent.
+
+Most invoices come from recurring suppliers billing the same kind of items,
+and those are coded the same way every time. The index remembers how past
+invoices were coded per supplier and line-item signature, so confident
+matches can skip the LLM altogether.
+"""
+import hashlib
+import re
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.db.session import SessionLocal
+from app.models.coding_pattern import CodingPattern
+from app.models.invoice import Invoice
+from app.models.invoice_extraction import InvoiceExtraction
+from app.models.supplier import Supplier
+from app.services.extractions import decode_extraction
+
+# Signature under which supplier-wide votes are recorded
+ANY_ITEMS = "*"
+
+_WORD_RE = re.compile(r"[a-z]{3,}")
+
+
+def supplier_key(tax_id: Optional[str], name: Optional[str]) -> Optional[str]:
+    """Normalize the supplier identity, preferring the tax ID over the name."""
+    if tax_id:
+        return "tax:" + re.sub(r"[^0-9a-z]", "", tax_id.lower())
+    if name:
+        return "name:" + " ".join(name.lower().split())
+    return None
+
+
+def line_item_signature(line_items: Optional[List[Dict[str, Any]]]) -> str:
+    """
+    Summarize line items as an order-independent signature.
+
+    Only description words are used, so quantities, prices and item numbers
+    that change from one invoice to the next do not change the signature.
+    """
+    words = set()
+    for item in line_items or []:
+        description = str(item.get("description") or "") if isinstance(item, dict) else str(item)
+        words.update(_WORD_RE.findall(description.lower()))
+
+    if not words:
+        return ANY_ITEMS
+
+    return hashlib.sha1(" ".join(sorted(words)).encode()).hexdigest()[:16]
+
+
+class CodingIndex:
+    """In-memory index of past coding decisions, persisted in `coding_patterns`."""
+
+    def __init__(self, min_confidence: float, min_occurrences: int):
+        """
+        Args:
+            min_confidence: Share of votes the top coding needs to be used
+            min_occurrences: Votes needed before a pattern is trusted
+        """
+        self.min_confidence = min_confidence
+        self.min_occurrences = min_occurrences
+        self._votes: Dict[Tuple[str, str], Dict[Tuple[str, str], int]] = defaultdict(dict)
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def lookup(self, key: Optional[str], signature: str) -> Optional[Tuple[str, str, float]]:
+        """
+        Find a confident coding for a supplier and line-item signature.
+
+        The exact signature is tried first, then the supplier-wide pattern.
+
+        Returns:
+            Tuple of (gl_account, cost_center, confidence), or None
+        """
+        if not key:
+            return None
+
+        self._ensure_loaded()
+
+        with self._lock:
+            for candidate in dict.fromkeys((signature, ANY_ITEMS)):
+                match = self._best(self._votes.get((key, candidate)))
+                if match is not None:
+                    return match
+
+        return None
+
+    def record(self, key: Optional[str], signature: str, gl_account: str, cost_center: str) -> None:
+        """Add a coding decision to the index and persist it."""
+        if not key:
+            return
+
+        self._ensure_loaded()
+
+        signatures = list(dict.fromkeys((signature, ANY_ITEMS)))
+        with self._lock:
+            for candidate in signatures:
+                votes = self._votes[(key, candidate)]
+                coding = (gl_account, cost_center)
+                votes[coding] = votes.get(coding, 0) + 1
+
+        db = SessionLocal()
+        try:
+            for candidate in signatures:
+                self._increment(db, key, candidate, gl_account, cost_center, 1)
+            db.commit()
+        except SQLAlchemyError:
+            # The in-memory index still learned the decision
+            db.rollback()
+        finally:
+            db.close()
+
+    def _best(self, votes: Optional[Dict[Tuple[str, str], int]]) -> Optional[Tuple[str, str, float]]:
+        """Return the top coding if it has enough support and agreement."""
+        if not votes:
+            return None
+
+        total = sum(votes.values())
+        (gl_account, cost_center), count = max(votes.items(), key=lambda vote: vote[1])
+        confidence = count / total
+
+        if total < self.min_occurrences or confidence < self.min_confidence:
+            return None
+
+        return gl_account, cost_center, round(confidence, 4)
+
+    def _ensure_loaded(self) -> None:
+        """Load persisted patterns, bootstrapping them from past invoices if empty."""
+        if self._loaded:
+            return
+
+        with self._lock:
+            if self._loaded:
+                return
+
+            db = SessionLocal()
+            try:
+                patterns = db.query(CodingPattern).all()
+                if not patterns:
+                    self._bootstrap(db)
+                    patterns = db.query(CodingPattern).all()
+
+                for pattern in patterns:
+                    votes = self._votes[(pattern.supplier_key, pattern.item_signature)]
+                    votes[(pattern.gl_account, pattern.cost_center)] = pattern.occurrences or 0
+            except SQLAlchemyError:
+                db.rollback()
+            finally:
+                db.close()
+
+            self._loaded = True
+
+    def _bootstrap(self, db) -> None:
+        """Build patterns from approved invoices that carry a coding."""
+        rows = db.query(
+            Supplier.tax_id,
+            Supplier.name,
+            InvoiceExtraction.data,
+            InvoiceExtraction.schema_version,
+            Invoice.gl_account,
+            Invoice.cost_center
+        ).join(Supplier, Invoice.supplier_id == Supplier.id).outerjoin(
+            InvoiceExtraction, InvoiceExtraction.invoice_id == Invoice.id
+        ).filter(
+            Invoice.status == "approved",
+            Invoice.gl_account.isnot(None),
+            Invoice.cost_center.isnot(None)
+        ).yield_per(1000)
+
+        counts: Dict[Tuple[str, str, str, str], int] = defaultdict(int)
+        for tax_id, name, data, schema_version, gl_account, cost_center in rows:
+            key = supplier_key(tax_id, name)
+            if not key:
+                continue
+
+            line_items = decode_extraction(data, schema_version).get("line_items") if data else None
+            for candidate in dict.fromkeys((line_item_signature(line_items), ANY_ITEMS)):
+                counts[(key, candidate, gl_account, cost_center)] += 1
+
+        for (key, signature, gl_account, cost_center), count in counts.items():
+            db.add(CodingPattern(
+                supplier_key=key,
+                item_signature=signature,
+                gl_account=gl_account,
+                cost_center=cost_center,
+                occurrences=count
+            ))
+        db.commit()
+
+    def _increment(self, db, key: str, signature: str, gl_account: str, cost_center: str, count: int) -> None:
+        """
+        Add votes to a persisted pattern, creating it if needed.
+
+        A single upsert, so workers recording the same coding at the same
+        time both count instead of one of them failing on the unique key.
+        """
+        insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+        statement = insert(CodingPattern.__table__).values(
+            supplier_key=key,
+            item_signature=signature,
+            gl_account=gl_account,
+            cost_center=cost_center,
+            occurrences=count
+        )
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["supplier_key", "item_signature", "gl_account", "cost_center"],
+            set_={
+                "occurrences": func.coalesce(CodingPattern.__table__.c.occurrences, 0) + count,
+                "updated_at": func.now()
+            }
+        ))
@@ -0,0 +1,164 @@
+"""
+Text extraction from PDF and image documents.
+
+Digitally generated PDFs carry a text layer, which pypdf reads page by
+page. Only pages without usable text (scans) and image uploads are sent to
+the chat model for transcription; those transcriptions are cached by the
+hash of the image, so the same scan is never paid for twice.
+"""
+import base64
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, NamedTuple, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import HumanMessage
+from pypdf import PdfReader
+
+from app.core.config import settings
+from app.agents.llm_client import llm_limiter
+
+VISION_PROMPT = (
+    "Transcribe all text on this invoice page exactly as printed, keeping the "
+    "reading order and the line breaks. Return only the text."
+)
+
+
+class PageText(NamedTuple):
+    """Text of one document page and how it was obtained."""
+
+    number: int  # 1-based
+    text: str
+    source: str  # text_layer, vision, vision_cache, empty
+
+
+class PageTextCache:
+    """LRU of page transcriptions keyed by the SHA-256 of the page image."""
+
+    def __init__(self, max_entries: int):
+        """
+        Args:
+            max_entries: Transcriptions kept before least recently used ones are evicted
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached transcription, or None on a miss."""
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return text
+
+    def put(self, key: str, text: str) -> None:
+        """Cache the transcription of a page image."""
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every cached transcription."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+
+        lookups = counters["hits"] + counters["misses"]
+        counters.update({
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            "size": size,
+            "max_entries": self.max_entries,
+        })
+        return counters
+
+
+# Global cache instance
+page_text_cache = PageTextCache(max_entries=settings.OCR_PAGE_CACHE_MAX_ENTRIES)
+
+
+class DocumentTextExtractor:
+    """Extracts document text, using the chat model only for pages without a text layer."""
+
+    def __init__(self, llm: Optional[BaseChatModel], cache: Optional[PageTextCache] = page_text_cache):
+        """
+        Args:
+            llm: Vision-capable chat model used to transcribe scanned pages,
+                or None to leave such pages empty
+            cache: Cache of page transcriptions, or None to disable caching
+        """
+        self.llm = llm if settings.OCR_VISION_ENABLED else None
+        self.cache = cache
+        self.min_page_chars = settings.OCR_MIN_PAGE_CHARS
+        self.max_pages = settings.OCR_MAX_PAGES
+
+    def iter_pdf_pages(self, document_path: str) -> Iterator[PageText]:
+        """
+        Yield the text of each PDF page as it is read.
+
+        The file stays open while iterating instead of being loaded into
+        memory, and pages are parsed only when reached.
+
+        Raises:
+            pypdf.errors.PdfReadError: If the document is not a readable PDF
+        """
+        with open(document_path, "rb") as f:
+            reader = PdfReader(f)
+            for index, page in enumerate(reader.pages):
+                if index >= self.max_pages:
+                    break
+
+                text = page.extract_text() or ""
+                if len(text.strip()) >= self.min_page_chars:
+                    yield PageText(index + 1, text, "text_layer")
+                    continue
+
+                # No usable text layer: transcribe the largest embedded image
+                images = page.images
+                if self.llm is None or not images:
+                    yield PageText(index + 1, text, "text_layer" if text.strip() else "empty")
+                    continue
+
+                image = max(images, key=lambda image: len(image.data))
+                mime_type = mimetypes.guess_type(image.name)[0] or "image/png"
+                transcription, source = self.transcribe(image.data, mime_type)
+                yield PageText(index + 1, transcription, source)
+
+    def transcribe(self, image: bytes, mime_type: str) -> Tuple[str, str]:
+        """
+        Transcribe an image with the chat model, or from the cache.
+
+        Returns:
+            The text and its source (vision or vision_cache)
+        """
+        key = hashlib.sha256(image).hexdigest()
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached, "vision_cache"
+
+        message = HumanMessage(content=[
+            {"type": "text", "text": VISION_PROMPT},
+            {
+                "type": "image_url",
+                "image_url": {"url": f"data:{mime_type};base64,{base64.b64encode(image).decode()}"},
+            },
+        ])
+        text = llm_limiter.call(self.llm.invoke, [message]).content
+
+        if self.cache is not None:
+            self.cache.put(key, text)
+        return text, "vision"
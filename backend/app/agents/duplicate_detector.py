@@ -0,0 +1,279 @@
+"""
+Duplicate invoice detection.
+
+Duplicates are checked twice: on the document hash before any OCR work, and
+on supplier plus invoice number once the data is extracted. A Bloom filter of
+known keys answers most lookups in memory; only possible matches are
+confirmed against the database through indexed queries.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.invoice import Invoice
+from app.models.supplier import Supplier
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over string keys."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        Args:
+            capacity: Expected number of keys
+            error_rate: Target false positive rate at capacity
+        """
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def _document_key(document_hash: str) -> str:
+    return f"doc:{document_hash}"
+
+
+def _invoice_key(supplier: str, invoice_number: str) -> str:
+    return f"inv:{supplier.strip().lower()}|{invoice_number.strip().lower()}"
+
+
+class DuplicateDetector:
+    """Bloom-filtered duplicate lookups backed by indexed database queries."""
+
+    def __init__(self, capacity: int, error_rate: float, refresh_interval: float):
+        """
+        Args:
+            capacity: Expected number of invoices
+            error_rate: Target false positive rate of the pre-filter
+            refresh_interval: Seconds between pulls of invoices created by
+                other workers into the filter
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self._filter: Optional[BloomFilter] = None
+        self._max_invoice_id = 0
+        self._refreshed_at = 0.0
+        self._refreshing = False  # A thread is pulling new invoices
+        self._pending = []  # Invoices registered while the first load runs
+        self._lock = threading.Lock()
+        self.filtered = 0  # Lookups answered by the filter alone
+        self.queried = 0  # Lookups that reached the database
+
+    def find_by_document(self, document_hash: Optional[str]) -> Optional[int]:
+        """
+        Find an invoice already created from the same document.
+
+        Returns:
+            ID of the existing invoice, or None
+        """
+        if not document_hash or not self._may_contain(_document_key(document_hash)):
+            return None
+
+        db = SessionLocal()
+        try:
+            return db.query(Invoice.id).filter(
+                Invoice.document_hash == document_hash
+            ).limit(1).scalar()
+        except SQLAlchemyError:
+            return None
+        finally:
+            db.close()
+
+    def find_invoice(
+        self,
+        supplier_tax_id: Optional[str],
+        supplier_name: Optional[str],
+        invoice_number: Optional[str],
+        total_amount: Optional[float] = None,
+        invoice_date: Optional[datetime] = None,
+    ) -> Optional[int]:
+        """
+        Find an existing invoice with the same supplier and invoice number.
+
+        When amount and date are given, an exact match on all four fields is
+        preferred, but any invoice reusing the number for the same supplier
+        is reported.
+
+        Returns:
+            ID of the existing invoice, or None
+        """
+        if not invoice_number or not (supplier_tax_id or supplier_name):
+            return None
+
+        if not self._may_contain(_invoice_key(supplier_tax_id or supplier_name, invoice_number)):
+            return None
+
+        db = SessionLocal()
+        try:
+            supplier_query = db.query(Supplier.id)
+            if supplier_tax_id:
+                supplier_query = supplier_query.filter(Supplier.tax_id == supplier_tax_id)
+            else:
+                supplier_query = supplier_query.filter(Supplier.name == supplier_name)
+            supplier_ids = [row.id for row in supplier_query.all()]
+            if not supplier_ids:
+                return None
+
+            # Leading columns of ix_invoices_duplicate_lookup
+            query = db.query(Invoice.id).filter(
+                Invoice.supplier_id.in_(supplier_ids),
+                Invoice.invoice_number == invoice_number
+            )
+
+            if total_amount is not None and invoice_date is not None:
+                exact = query.filter(
+                    Invoice.total_amount == total_amount,
+                    Invoice.invoice_date == invoice_date
+                ).limit(1).scalar()
+                if exact is not None:
+                    return exact
+
+            return query.limit(1).scalar()
+        except SQLAlchemyError:
+            return None
+        finally:
+            db.close()
+
+    def register(
+        self,
+        document_hash: Optional[str],
+        supplier_tax_id: Optional[str],
+        supplier_name: Optional[str],
+        invoice_number: Optional[str],
+    ) -> None:
+        """Add a newly stored invoice to the filter."""
+        keys = (document_hash, supplier_tax_id, supplier_name, invoice_number)
+        with self._lock:
+            if self._filter is not None:
+                self._add(self._filter, *keys)
+            elif self._refreshing:
+                # The first load may have read the table before this invoice
+                self._pending.append(keys)
+            # Otherwise it is loaded from the database on first lookup
+
+    def stats(self) -> dict:
+        """Return pre-filter effectiveness counters for this process."""
+        with self._lock:
+            filtered, queried = self.filtered, self.queried
+        lookups = filtered + queried
+        return {
+            "filtered": filtered,
+            "queried": queried,
+            "filter_rate": round(filtered / lookups, 4) if lookups else 0.0,
+        }
+
+    def _may_contain(self, key: str) -> bool:
+        """Check the filter, loading or refreshing it first if due."""
+        with self._lock:
+            refresh = not self._refreshing and (
+                self._filter is None or time.monotonic() - self._refreshed_at >= self.refresh_interval
+            )
+            if refresh:
+                self._refreshing = True
+
+        if refresh:
+            self._load()
+
+        with self._lock:
+            if self._filter is not None and key not in self._filter:
+                self.filtered += 1
+                return False
+            # No filter yet (first load still running or failed) means no answer
+            self.queried += 1
+        return True
+
+    def _load(self) -> None:
+        """
+        Add invoices created since the last load to the filter.
+
+        Runs in the one thread that claimed the refresh, outside the lock;
+        other lookups keep using the current filter meanwhile.
+        """
+        with self._lock:
+            bloom = self._filter
+            max_invoice_id = self._max_invoice_id
+
+        new_rows = []
+        loaded = False
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                Invoice.id,
+                Invoice.document_hash,
+                Invoice.invoice_number,
+                Supplier.tax_id,
+                Supplier.name
+            ).join(Supplier, Invoice.supplier_id == Supplier.id).filter(
+                Invoice.id > max_invoice_id
+            ).order_by(Invoice.id).yield_per(5000)
+
+            if bloom is None:
+                # Not published yet, so it can be filled without the lock
+                bloom = BloomFilter(self.capacity, self.error_rate)
+                for invoice_id, document_hash, invoice_number, tax_id, name in rows:
+                    self._add(bloom, document_hash, tax_id, name, invoice_number)
+                    max_invoice_id = invoice_id
+            else:
+                new_rows = rows.all()
+            loaded = True
+        except SQLAlchemyError:
+            pass
+        finally:
+            db.close()
+
+            with self._lock:
+                if loaded:
+                    for keys in self._pending:
+                        self._add(bloom, *keys)
+                    for invoice_id, document_hash, invoice_number, tax_id, name in new_rows:
+                        self._add(bloom, document_hash, tax_id, name, invoice_number)
+                        max_invoice_id = invoice_id
+                else:
+                    # Without a complete filter every lookup must go to the database
+                    bloom = None
+                    max_invoice_id = 0
+
+                self._filter = bloom
+                self._max_invoice_id = max_invoice_id
+                self._pending = []
+                self._refreshed_at = time.monotonic()
+                self._refreshing = False
+
+    @staticmethod
+    def _add(bloom: BloomFilter, document_hash, supplier_tax_id, supplier_name, invoice_number) -> None:
+        if document_hash:
+            bloom.add(_document_key(document_hash))
+        if invoice_number:
+            # Keyed by tax ID and by name, for lookups without a tax ID
+            for supplier in (supplier_tax_id, supplier_name):
+                if supplier:
+                    bloom.add(_invoice_key(supplier, invoice_number))
+
+
+# Global detector instance
+duplicate_detector = DuplicateDetector(
+    capacity=settings.DUPLICATE_FILTER_CAPACITY,
+    error_rate=settings.DUPLICATE_FILTER_ERROR_RATE,
+    refresh_interval=settings.DUPLICATE_FILTER_REFRESH_SECONDS,
+)
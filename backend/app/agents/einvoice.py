@@ -0,0 +1,188 @@
+"""
+Deterministic extraction of structured XML e-invoices.
+
+UBL 2.x (Invoice, CreditNote) and UN/CEFACT CII (CrossIndustryInvoice)
+documents already carry every field the pipeline needs, so they are read
+directly instead of going through the LLM. Documents are streamed with
+iterparse and each element is dropped once read, so memory stays bounded
+regardless of the number of line items.
+"""
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional
+
+# Bump when extraction logic changes to invalidate cached results
+PARSER_VERSION = "1"
+
+UBL_INVOICE_NS = "urn:oasis:names:specification:ubl:schema:xsd:Invoice-2"
+UBL_CREDIT_NOTE_NS = "urn:oasis:names:specification:ubl:schema:xsd:CreditNote-2"
+CII_NS = "urn:un:unece:uncefact:data:standard:CrossIndustryInvoice:100"
+
+# Header fields by element path below the root; the first match wins
+UBL_FIELDS = {
+    "ID": "invoice_number",
+    "IssueDate": "invoice_date",
+    "DueDate": "due_date",
+    "PaymentMeans/PaymentDueDate": "due_date",
+    "DocumentCurrencyCode": "currency",
+    "OrderReference/ID": "po_number",
+    "AccountingSupplierParty/Party/PartyLegalEntity/RegistrationName": "supplier_name",
+    "AccountingSupplierParty/Party/PartyName/Name": "supplier_name",
+    "AccountingSupplierParty/Party/PartyTaxScheme/CompanyID": "supplier_tax_id",
+    "AccountingSupplierParty/Party/PartyLegalEntity/CompanyID": "supplier_tax_id",
+    "TaxTotal/TaxAmount": "tax_amount",
+    "LegalMonetaryTotal/TaxExclusiveAmount": "net_amount",
+    "LegalMonetaryTotal/TaxInclusiveAmount": "total_amount",
+    "LegalMonetaryTotal/PayableAmount": "total_amount",
+}
+
+UBL_LINE_FIELDS = {
+    "Item/Name": "description",
+    "Item/Description": "description",
+    "InvoicedQuantity": "quantity",
+    "CreditedQuantity": "quantity",
+    "Price/PriceAmount": "unit_price",
+    "LineExtensionAmount": "total",
+}
+
+CII_FIELDS = {
+    "ExchangedDocument/ID": "invoice_number",
+    "ExchangedDocument/IssueDateTime/DateTimeString": "invoice_date",
+    "SupplyChainTradeTransaction/ApplicableHeaderTradeAgreement/SellerTradeParty/Name": "supplier_name",
+    "SupplyChainTradeTransaction/ApplicableHeaderTradeAgreement/SellerTradeParty/"
+    "SpecifiedTaxRegistration/ID": "supplier_tax_id",
+    "SupplyChainTradeTransaction/ApplicableHeaderTradeAgreement/BuyerOrderReferencedDocument/"
+    "IssuerAssignedID": "po_number",
+    "SupplyChainTradeTransaction/ApplicableHeaderTradeSettlement/InvoiceCurrencyCode": "currency",
+    "SupplyChainTradeTransaction/ApplicableHeaderTradeSettlement/SpecifiedTradePaymentTerms/"
+    "DueDateDateTime/DateTimeString": "due_date",
+    "SupplyChainTradeTransaction/ApplicableHeaderTradeSettlement/"
+    "SpecifiedTradeSettlementHeaderMonetarySummation/TaxBasisTotalAmount": "net_amount",
+    "SupplyChainTradeTransaction/ApplicableHeaderTradeSettlement/"
+    "SpecifiedTradeSettlementHeaderMonetarySummation/TaxTotalAmount": "tax_amount",
+    "SupplyChainTradeTransaction/ApplicableHeaderTradeSettlement/"
+    "SpecifiedTradeSettlementHeaderMonetarySummation/GrandTotalAmount": "total_amount",
+}
+
+CII_LINE_FIELDS = {
+    "SpecifiedTradeProduct/Name": "description",
+    "SpecifiedLineTradeDelivery/BilledQuantity": "quantity",
+    "SpecifiedLineTradeAgreement/NetProductPriceTradePrice/ChargeAmount": "unit_price",
+    "SpecifiedLineTradeSettlement/SpecifiedTradeSettlementLineMonetarySummation/LineTotalAmount": "total",
+}
+
+# Schema by root element: header fields, line element path and line fields
+SCHEMAS = {
+    (UBL_INVOICE_NS, "Invoice"): (UBL_FIELDS, "InvoiceLine", UBL_LINE_FIELDS),
+    (UBL_CREDIT_NOTE_NS, "CreditNote"): (UBL_FIELDS, "CreditNoteLine", UBL_LINE_FIELDS),
+    (CII_NS, "CrossIndustryInvoice"): (
+        CII_FIELDS, "SupplyChainTradeTransaction/IncludedSupplyChainTradeLineItem", CII_LINE_FIELDS
+    ),
+}
+
+AMOUNT_FIELDS = {"total_amount", "tax_amount", "net_amount", "quantity", "unit_price", "total"}
+DATE_FIELDS = {"invoice_date", "due_date"}
+
+
+class UnsupportedEInvoiceError(ValueError):
+    """Raised for XML documents that are not a supported e-invoice schema."""
+
+
+def _split_tag(tag: str):
+    """Split an ElementTree tag into (namespace, local name)."""
+    if tag.startswith("{"):
+        namespace, _, name = tag[1:].partition("}")
+        return namespace, name
+    return "", tag
+
+
+def _amount(text: str) -> Optional[float]:
+    try:
+        return float(Decimal(text))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _date(text: str) -> Optional[str]:
+    """Normalize UBL (YYYY-MM-DD) and CII format 102 (YYYYMMDD) dates to ISO."""
+    for pattern in ("%Y-%m-%d", "%Y%m%d"):
+        try:
+            return datetime.strptime(text[:10] if "-" in text else text[:8], pattern).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _convert(field: str, text: str) -> Any:
+    if field in AMOUNT_FIELDS:
+        return _amount(text)
+    if field in DATE_FIELDS:
+        return _date(text)
+    return text
+
+
+def parse_einvoice(document_path: str) -> Dict[str, Any]:
+    """
+    Extract invoice fields from a UBL or CII e-invoice.
+
+    Args:
+        document_path: Path to the XML document
+
+    Returns:
+        Extracted fields in the same shape as the OCR agent's LLM output,
+        with ISO dates and numeric amounts
+
+    Raises:
+        UnsupportedEInvoiceError: If the root element is not a supported schema
+        xml.etree.ElementTree.ParseError: If the document is not well-formed XML
+    """
+    data: Dict[str, Any] = {"line_items": []}
+    schema = None
+    path: List[str] = []
+    parents: List[ET.Element] = []
+    line: Optional[Dict[str, Any]] = None
+    line_depth = 0
+
+    for event, element in ET.iterparse(document_path, events=("start", "end")):
+        namespace, name = _split_tag(element.tag)
+
+        if event == "start":
+            if schema is None:
+                schema = SCHEMAS.get((namespace, name))
+                if schema is None:
+                    raise UnsupportedEInvoiceError(f"Unsupported XML root element {element.tag}")
+                fields, line_path, line_fields = schema
+                line_depth = line_path.count("/") + 2
+            else:
+                path.append(name)
+                if "/".join(path) == line_path:
+                    line = {}
+            parents.append(element)
+            continue
+
+        parents.pop()
+        text = (element.text or "").strip()
+
+        if line is not None and len(path) >= line_depth:
+            field = line_fields.get("/".join(path[line_depth - 1:]))
+            if field and text and field not in line:
+                line[field] = _convert(field, text)
+        elif path:
+            field = fields.get("/".join(path))
+            if field and text and data.get(field) is None:
+                data[field] = _convert(field, text)
+
+        if line is not None and len(path) == line_depth - 1:
+            data["line_items"].append(line)
+            line = None
+
+        # Drop the element once read so memory does not grow with the document
+        if parents:
+            parents[-1].remove(element)
+            path.pop()
+
+    if schema is None:
+        raise UnsupportedEInvoiceError("Empty XML document")
+
+    return data
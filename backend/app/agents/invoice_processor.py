@@ -1,17 +1,30 @@
 """
 Invoice Processor - Main orchestrator using LangGraph.
 """
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
 from datetime import datetime
+import hashlib
+import os
 import time
 
+from langchain_core.language_models import BaseChatModel
 from langgraph.graph import StateGraph, END
+from app.core.config import settings
 from app.agents.state import InvoiceProcessingState
+from app.agents.result_cache import result_cache, hash_file
+from app.agents.duplicate_detector import duplicate_detector
+from app.agents.llm_cache import template_hash
+from app.agents.einvoice import PARSER_VERSION as EINVOICE_PARSER_VERSION
+from app.agents.stage_metrics import pipeline_metrics, timed_node
 from app.agents.ocr_agent import OCRAgent
 from app.agents.validation_agent import ValidationAgent
 from app.agents.coding_agent import CodingAgent
 from app.agents.approval_agent import ApprovalAgent
 
+# State fields written by the coding agent, merged back from speculative runs
+CODING_FIELDS = ("gl_account", "cost_center", "accounting_entries", "coding_source", "coding_confidence")
+
 
 class InvoiceProcessor:
     """
@@ -23,18 +36,57 @@ class InvoiceProcessor:
     3. Coding: Assign GL accounts
     4. Approval: Determine approval requirements
     5. ERP: Post to ERP (if touchless) or send for approval
+
+    With SPECULATIVE_CODING, coding starts right after OCR and runs
+    concurrently with validation; its result is dropped if validation
+    stops the invoice.
     """
 
-    def __init__(self):
-        """Initialize processor with all agents."""
-        self.ocr_agent = OCRAgent()
+    def __init__(self, llm: Optional[BaseChatModel] = None):
+        """
+        Initialize processor with all agents.
+
+        Args:
+            llm: Chat model shared by the agents instead of the configured
+                Azure OpenAI deployment (used by benchmarks)
+        """
+        self.ocr_agent = OCRAgent(llm=llm)
         self.validation_agent = ValidationAgent()
-        self.coding_agent = CodingAgent()
+        self.coding_agent = CodingAgent(llm=llm)
         self.approval_agent = ApprovalAgent()
 
+        # Results of identical documents are reused across uploads
+        self.result_cache = result_cache
+        self.pipeline_version = self._compute_pipeline_version()
+
+        self.speculative_coding = settings.SPECULATIVE_CODING
+        self._coding_pool = ThreadPoolExecutor(
+            max_workers=settings.SPECULATIVE_CODING_WORKERS,
+            thread_name_prefix="speculative-coding",
+        ) if self.speculative_coding else None
+
         # Build workflow graph
         self.workflow = self._build_workflow()
 
+    def _compute_pipeline_version(self) -> str:
+        """
+        Fingerprint everything that shapes a result: the pipeline version,
+        the model deployment, the agent prompts, the e-invoice parser and
+        the prompt token budget. Changing any of them invalidates previously
+        cached results.
+        """
+        parts = [
+            settings.PIPELINE_VERSION,
+            EINVOICE_PARSER_VERSION,
+            str(settings.OCR_PROMPT_TOKEN_BUDGET),
+            settings.AZURE_OPENAI_DEPLOYMENT,
+            template_hash(self.ocr_agent.extraction_prompt),
+            template_hash(self.coding_agent.coding_prompt),
+            template_hash(self.coding_agent.batch_prompt),
+        ]
+
+        return hashlib.sha256("\x00".join(parts).encode()).hexdigest()[:16]
+
     def _build_workflow(self) -> StateGraph:
         """Build the invoice processing workflow using LangGraph."""
 
@@ -42,31 +94,66 @@ class InvoiceProcessor:
         workflow = StateGraph(InvoiceProcessingState)
 
         # Add nodes (agents)
-        workflow.add_node("ocr", self.ocr_agent.process)
-        workflow.add_node("validation", self.validation_agent.process)
-        workflow.add_node("coding", self.coding_agent.process)
-        workflow.add_node("approval", self.approval_agent.process)
-        workflow.add_node("finalize", self._finalize)
+        workflow.add_node("ocr", timed_node("ocr", self.ocr_agent.process))
+        workflow.add_node("approval", timed_node("approval", self.approval_agent.process))
+        workflow.add_node("finalize", timed_node("finalize", self._finalize))
 
         # Define edges (workflow flow)
         workflow.set_entry_point("ocr")
 
-        # OCR -> Validation
-        workflow.add_edge("ocr", "validation")
+        if self.speculative_coding:
+            self._timed_validation = timed_node("validation", self.validation_agent.process)
+            self._timed_coding = timed_node("coding", self.coding_agent.code)
+
+            # OCR -> Validation with coding in parallel
+            workflow.add_node("validation", self._validate_and_code)
+            workflow.add_conditional_edges(
+                "ocr",
+                self._should_continue_after_ocr,
+                {
+                    "continue": "validation",
+                    "stop": "finalize"
+                }
+            )
+
+            # Validation -> Approval (already coded) or Clarification
+            workflow.add_conditional_edges(
+                "validation",
+                self._should_continue_after_validation,
+                {
+                    "continue": "approval",
+                    "clarification": "finalize",
+                    "reject": "finalize"
+                }
+            )
 
-        # Validation -> Coding or Clarification
-        workflow.add_conditional_edges(
-            "validation",
-            self._should_continue_after_validation,
-            {
-                "continue": "coding",
-                "clarification": "finalize",
-                "reject": "finalize"
-            }
-        )
-
-        # Coding -> Approval
-        workflow.add_edge("coding", "approval")
+        else:
+            workflow.add_node("validation", timed_node("validation", self.validation_agent.process))
+            workflow.add_node("coding", timed_node("coding", self.coding_agent.process))
+
+            # OCR -> Validation
+            workflow.add_conditional_edges(
+                "ocr",
+                self._should_continue_after_ocr,
+                {
+                    "continue": "validation",
+                    "stop": "finalize"
+                }
+            )
+
+            # Validation -> Coding or Clarification
+            workflow.add_conditional_edges(
+                "validation",
+                self._should_continue_after_validation,
+                {
+                    "continue": "coding",
+                    "clarification": "finalize",
+                    "reject": "finalize"
+                }
+            )
+
+            # Coding -> Approval
+            workflow.add_edge("coding", "approval")
 
         # Approval -> Finalize
         workflow.add_edge("approval", "finalize")
@@ -76,6 +163,45 @@ class InvoiceProcessor:
 
         return workflow.compile()
 
+    def _validate_and_code(self, state: InvoiceProcessingState) -> InvoiceProcessingState:
+        """
+        Validate the invoice while coding it speculatively on another thread.
+
+        Coding only needs the OCR output, so it works on a copy of the state.
+        The coding is merged (and recorded in the coding index) only if
+        validation lets the invoice continue.
+        """
+        coding_input = dict(state, processing_errors=[], stage_metrics={})
+        coding = self._coding_pool.submit(self._timed_coding, coding_input)
+
+        state = self._timed_validation(state)
+
+        if self._should_continue_after_validation(state) != "continue":
+            coding.cancel()
+            return state
+
+        coded = coding.result()
+        for field in CODING_FIELDS:
+            state[field] = coded.get(field)
+        state["processing_errors"].extend(coded["processing_errors"])
+        state["stage_metrics"] = {**state["stage_metrics"], **coded["stage_metrics"]}
+        state["current_step"] = coded["current_step"]
+
+        self.coding_agent.remember(state)
+        return state
+
+    def _should_continue_after_ocr(self, state: InvoiceProcessingState) -> str:
+        """
+        Decide next step after OCR.
+
+        Returns:
+            "continue" - proceed to validation
+            "stop" - extraction failed or was aborted, needs manual review
+        """
+        if state.get("current_step") in ("ocr_aborted", "ocr_failed"):
+            return "stop"
+        return "continue"
+
     def _should_continue_after_validation(self, state: InvoiceProcessingState) -> str:
         """
         Decide next step after validation.
@@ -139,24 +265,55 @@ class InvoiceProcessor:
 
         return state
 
-    def process_invoice(self, document_path: str, document_format: str) -> Dict[str, Any]:
+    def _duplicate_document(
+        self,
+        state: InvoiceProcessingState,
+        duplicate_of: int,
+        start_time: float
+    ) -> InvoiceProcessingState:
+        """Mark a document that was already turned into an invoice."""
+        message = f"Duplicate of invoice {duplicate_of} (identical document)"
+        state["duplicate_detected"] = True
+        state["duplicate_of"] = duplicate_of
+        state["is_valid"] = False
+        state["validation_errors"] = [message]
+        state["clarification_needed"] = True
+        state["clarification_message"] = message
+
+        state = self._finalize(state)
+        state["processing_time"] = time.time() - start_time
+        pipeline_metrics.invoice_seconds.observe(state["processing_time"], source="duplicate")
+
+        return state
+
+    def process_invoice(
+        self,
+        document_path: str,
+        document_format: str,
+        document_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Process an invoice through the complete workflow.
 
         Args:
             document_path: Path to invoice document
             document_format: Format of document (pdf, xml, etc.)
+            document_hash: SHA-256 of the document, if already computed
 
         Returns:
             Processing results
         """
         start_time = time.time()
 
+        if document_hash is None and os.path.exists(document_path):
+            document_hash = hash_file(document_path)
+
         # Initialize state
         initial_state: InvoiceProcessingState = {
             "document_path": document_path,
             "document_format": document_format,
             "document_content": None,
+            "document_hash": document_hash,
             "invoice_number": None,
             "supplier_name": None,
             "supplier_tax_id": None,
@@ -168,17 +325,21 @@ class InvoiceProcessor:
             "currency": None,
             "po_number": None,
             "line_items": None,
+            "extraction_source": None,
             "validation_errors": [],
             "confidence_score": 0.0,
             "is_valid": True,
             "fraud_detected": False,
             "duplicate_detected": False,
+            "duplicate_of": None,
             "po_matched": False,
             "po_data": None,
             "supplier_id": None,
             "gl_account": None,
             "cost_center": None,
             "accounting_entries": None,
+            "coding_source": None,
+            "coding_confidence": None,
             "requires_approval": False,
             "approval_threshold": 0.0,
             "approver_id": None,
@@ -189,17 +350,47 @@ class InvoiceProcessor:
             "clarification_message": None,
             "processed_at": None,
             "processing_time": None,
+            "stage_metrics": {},
+            "from_cache": False,
         }
 
+        # Same document already booked: skip the pipeline entirely
+        duplicate_of = duplicate_detector.find_by_document(document_hash)
+        if duplicate_of is not None:
+            return self._duplicate_document(initial_state, duplicate_of, start_time)
+
+        # Reuse the result of an identical, previously processed document
+        if self.result_cache is not None and document_hash:
+            cached_state = self.result_cache.get(document_hash, self.pipeline_version)
+            if cached_state is not None:
+                cached_state.update({
+                    "document_path": document_path,
+                    "document_format": document_format,
+                    "document_hash": document_hash,
+                    "from_cache": True,
+                    "processing_time": time.time() - start_time,
+                    "stage_metrics": {},
+                })
+                pipeline_metrics.invoice_seconds.observe(cached_state["processing_time"], source="cache")
+                return cached_state
+
         # Run workflow
         final_state = self.workflow.invoke(initial_state)
 
         # Calculate processing time
         processing_time = time.time() - start_time
         final_state["processing_time"] = processing_time
+        pipeline_metrics.invoice_seconds.observe(processing_time, source="pipeline")
+
+        # Only clean runs are cached so transient LLM failures are retried, and
+        # duplicates are not, or a resubmission would replay a stale verdict
+        if (
+            self.result_cache is not None
+            and document_hash
+            and not final_state["processing_errors"]
+            and not final_state.get("duplicate_detected")
+        ):
+            self.result_cache.put(document_hash, self.pipeline_version, final_state)
 
         return final_state
 
-
-# Global processor instance
-invoice_processor = InvoiceProcessor()
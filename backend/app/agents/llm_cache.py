@@ -0,0 +1,386 @@
+"""
+Two-tier cache of LLM responses.
+
+Reprocessing and retries send byte-identical prompts to the model. Responses
+are keyed on the normalized prompt variables, the prompt template and the
+model deployment, and kept in an in-memory LRU backed by an on-disk SQLite
+store that survives restarts and is shared by workers on the same host.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Tuple
+
+from app.core.config import settings
+from app.agents.llm_client import llm_limiter
+from app.agents.text_compaction import count_tokens
+
+if TYPE_CHECKING:
+    from langchain.prompts import ChatPromptTemplate
+
+
+def template_hash(prompt: "ChatPromptTemplate") -> str:
+    """Fingerprint the message templates of a prompt."""
+    parts = []
+    for message in prompt.messages:
+        template = getattr(getattr(message, "prompt", None), "template", None)
+        parts.append(template if template is not None else repr(message))
+    return hashlib.sha256("\x00".join(parts).encode()).hexdigest()[:16]
+
+
+def normalize_text(value: Any) -> Any:
+    """Collapse whitespace so formatting-only differences share a cache entry."""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+
+class LLMResponseCache:
+    """In-memory LRU in front of an on-disk SQLite store, with TTL and hit counters."""
+
+    def __init__(
+        self,
+        memory_entries: int,
+        disk_path: Optional[str],
+        disk_max_entries: int,
+        ttl_seconds: float,
+    ):
+        """
+        Args:
+            memory_entries: Responses kept in the in-memory LRU
+            disk_path: SQLite file for the on-disk tier, or None for memory only
+            disk_max_entries: Responses kept on disk before least recently
+                used ones are evicted
+            ttl_seconds: Age after which a response is no longer served
+        """
+        self.memory_entries = memory_entries
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()  # Memory tier and counters
+        self._disk_lock = threading.Lock()  # The SQLite connection
+        self._accessed: Dict[str, float] = {}  # Disk hits whose last_access is not written yet
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_opened = False
+        self._writes_since_sweep = 0
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "expired": 0,
+            "evictions": 0,
+        }
+
+    def key(self, deployment: str, prompt: "ChatPromptTemplate", variables: Dict[str, Any]) -> str:
+        """Build the cache key for a prompt invocation."""
+        payload = json.dumps(
+            {
+                "deployment": deployment,
+                "template": template_hash(prompt),
+                "variables": {name: normalize_text(value) for name, value in variables.items()},
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached response, or None on a miss."""
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                content, stored_at = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return content
+                del self._memory[key]
+                self._counters["expired"] += 1
+
+        # Disk I/O happens outside the memory lock so memory hits never wait on it
+        row = None
+        with self._disk_lock:
+            disk = self._open_disk()
+            if disk is not None:
+                try:
+                    row = disk.execute(
+                        "SELECT content, created_at FROM llm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error:
+                    row = None
+
+        with self._lock:
+            if row is not None and now - row[1] <= self.ttl_seconds:
+                self._remember(key, row[0], row[1])
+                # Written with the next store instead of committing on every hit
+                self._accessed[key] = now
+                self._counters["disk_hits"] += 1
+                return row[0]
+            if row is not None:
+                self._counters["expired"] += 1
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, content: str) -> None:
+        """Store a response in both tiers."""
+        now = time.time()
+
+        with self._lock:
+            self._remember(key, content, now)
+            self._counters["stores"] += 1
+            accessed, self._accessed = self._accessed, {}
+
+        expired = evicted = 0
+        with self._disk_lock:
+            disk = self._open_disk()
+            if disk is None:
+                return
+
+            try:
+                disk.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, content, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, content, now, now)
+                )
+                if accessed:
+                    disk.executemany(
+                        "UPDATE llm_cache SET last_access = ? WHERE key = ?",
+                        [(accessed_at, accessed_key) for accessed_key, accessed_at in accessed.items()]
+                    )
+                disk.commit()
+
+                # Sweeping on every write would dominate write cost
+                self._writes_since_sweep += 1
+                if self._writes_since_sweep >= 100:
+                    self._writes_since_sweep = 0
+                    expired, evicted = self._sweep(disk, now)
+            except sqlite3.Error:
+                pass
+
+        if expired or evicted:
+            with self._lock:
+                self._counters["expired"] += expired
+                self._counters["evictions"] += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            counters = dict(self._counters)
+            memory_size = len(self._memory)
+
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        counters.update({
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_size": memory_size,
+            "memory_entries": self.memory_entries,
+            "disk_enabled": self._disk is not None,
+            "ttl_seconds": self.ttl_seconds,
+        })
+        return counters
+
+    def _remember(self, key: str, content: str, stored_at: float) -> None:
+        """Add to the in-memory LRU, evicting the oldest entry if full."""
+        self._memory[key] = (content, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _open_disk(self) -> Optional[sqlite3.Connection]:
+        """
+        Open the on-disk tier on first use; stay memory-only if that fails.
+
+        Called with the disk lock held.
+        """
+        if self._disk_opened:
+            return self._disk
+
+        self._disk_opened = True
+        if not self.disk_path:
+            return None
+
+        try:
+            os.makedirs(os.path.dirname(self.disk_path) or ".", exist_ok=True)
+            disk = sqlite3.connect(self.disk_path, check_same_thread=False, timeout=5)
+            disk.execute("PRAGMA journal_mode=WAL")
+            disk.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, content TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            disk.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)")
+            disk.commit()
+            self._disk = disk
+        except (OSError, sqlite3.Error):
+            self._disk = None
+
+        return self._disk
+
+    def _sweep(self, disk: sqlite3.Connection, now: float) -> Tuple[int, int]:
+        """
+        Drop expired entries and trim the disk tier to its size limit.
+
+        Returns:
+            Numbers of expired and evicted entries
+        """
+        expired = disk.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        excess = disk.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.disk_max_entries
+        evicted = 0
+        if excess > 0:
+            evicted = disk.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                (excess,)
+            ).rowcount
+        disk.commit()
+
+        return expired, evicted
+
+
+# Global cache instance
+llm_cache = LLMResponseCache(
+    memory_entries=settings.LLM_CACHE_MEMORY_ENTRIES,
+    disk_path=settings.LLM_CACHE_PATH or None,
+    disk_max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+)
+
+
+def cached_invoke(prompt: "ChatPromptTemplate", llm: Any, variables: Dict[str, Any]) -> str:
+    """
+    Run `prompt | llm` with the given variables, serving repeats from the cache.
+
+    Model calls go through the shared concurrency limit and retry policy.
+
+    Returns:
+        The response content
+    """
+    if not settings.LLM_CACHE_ENABLED:
+        return llm_limiter.call((prompt | llm).invoke, variables).content
+
+    deployment = getattr(llm, "deployment_name", None) or settings.AZURE_OPENAI_DEPLOYMENT
+    key = llm_cache.key(deployment, prompt, variables)
+
+    content = llm_cache.get(key)
+    if content is None:
+        content = llm_limiter.call((prompt | llm).invoke, variables).content
+        llm_cache.put(key, content)
+
+    return content
+
+
+def _stream_usage(prompt: "ChatPromptTemplate", variables: Dict[str, Any], content: str) -> Dict[str, int]:
+    """Count the tokens of a streamed completion that reported no usage."""
+    prompt_tokens = sum(count_tokens(str(message.content)) for message in prompt.format_messages(**variables))
+    completion_tokens = count_tokens(content)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def report_usage(llm: Any, usage: Dict[str, int]) -> None:
+    """
+    Add token usage to the active `get_openai_callback` handler.
+
+    Used for streamed completions, which never reach the handler with usage,
+    and for shares of batched calls made by another thread; per-node token
+    accounting would otherwise miss them.
+    """
+    from langchain_community.callbacks.manager import openai_callback_var
+    from langchain_core.outputs import LLMResult
+
+    handler = openai_callback_var.get()
+    if handler is not None:
+        deployment = getattr(llm, "deployment_name", None) or settings.AZURE_OPENAI_DEPLOYMENT
+        handler.on_llm_end(LLMResult(
+            generations=[],
+            llm_output={"token_usage": usage, "model_name": deployment},
+        ))
+
+
+@contextmanager
+def separate_usage() -> Iterator[Any]:
+    """
+    Count LLM token usage apart from the active `get_openai_callback` handler.
+
+    Unlike a nested `get_openai_callback`, which leaves no handler active
+    when it exits, the outer handler is restored afterwards.
+
+    Yields:
+        OpenAICallbackHandler receiving the usage of calls made in the block
+    """
+    from langchain_community.callbacks import OpenAICallbackHandler
+    from langchain_community.callbacks.manager import openai_callback_var
+
+    handler = OpenAICallbackHandler()
+    token = openai_callback_var.set(handler)
+    try:
+        yield handler
+    finally:
+        openai_callback_var.reset(token)
+
+
+def cached_stream(prompt: "ChatPromptTemplate", llm: Any, variables: Dict[str, Any], consumer: Any) -> str:
+    """
+    Stream `prompt | llm` into `consumer`, serving repeats from the cache.
+
+    `consumer.reset()` is called before each attempt, `consumer.feed(text)`
+    with every chunk and `consumer.finish()` at the end; a cached response is
+    fed as one chunk. An exception raised by `feed` stops the stream, and an
+    exception raised by either keeps the response out of the cache.
+
+    Token usage, as reported in a chunk's `token_usage` or else counted
+    locally, goes to the active `get_openai_callback` handler, also for
+    streams stopped early.
+
+    Returns:
+        The response content
+    """
+    key = None
+    if settings.LLM_CACHE_ENABLED:
+        deployment = getattr(llm, "deployment_name", None) or settings.AZURE_OPENAI_DEPLOYMENT
+        key = llm_cache.key(deployment, prompt, variables)
+
+        content = llm_cache.get(key)
+        if content is not None:
+            consumer.reset()
+            consumer.feed(content)
+            consumer.finish()
+            return content
+
+    def stream() -> str:
+        consumer.reset()
+        parts = []
+        usage = None
+        chunks = (prompt | llm).stream(variables)
+        try:
+            for chunk in chunks:
+                parts.append(chunk.content)
+                usage = chunk.additional_kwargs.get("token_usage") or usage
+                consumer.feed(chunk.content)
+        finally:
+            # Stop generation early if the consumer gave up
+            chunks.close()
+            if parts or usage:
+                report_usage(llm, usage or _stream_usage(prompt, variables, "".join(parts)))
+        consumer.finish()
+        return "".join(parts)
+
+    content = llm_limiter.call(stream)
+    if key is not None:
+        llm_cache.put(key, content)
+
+    return content
@@ -0,0 +1,207 @@
+"""
+Shared Azure OpenAI client.
+
+All agents use chat models built here on one keep-alive HTTP connection
+pool, and every model call goes through `llm_limiter`. The limiter caps
+the calls in flight per worker and retries rate limits (429), server
+errors (5xx), timeouts and connection failures with jittered exponential
+backoff. The SDK's own retries are disabled so the two do not multiply.
+"""
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.services.jobs import RetryLaterError
+
+
+class LLMUnavailableError(RetryLaterError):
+    """Raised when the model keeps failing with retryable errors."""
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait, if it said."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    import openai
+
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return isinstance(error, httpx.TimeoutException)
+
+
+class LLMCallLimiter:
+    """Caps concurrent model calls and retries transient failures with backoff."""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+    ):
+        """
+        Args:
+            max_concurrency: Model calls allowed in flight at once
+            max_retries: Retries of a call before giving up
+            backoff_base: Upper bound of the first backoff, in seconds
+            backoff_max: Upper bound of any backoff, in seconds
+        """
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {
+            "calls": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+            "gave_up": 0,
+            "wait_seconds_total": 0.0,
+            "in_flight_peak": 0,
+        }
+
+    def call(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Call `func` within the concurrency limit, retrying transient failures.
+
+        Raises:
+            LLMUnavailableError: If every attempt failed with a retryable error
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._call_once(func, *args, **kwargs)
+            except Exception as e:
+                if not _is_retryable(e):
+                    raise
+                self._record_failure(e)
+                if attempt == self.max_retries:
+                    self._increment("gave_up")
+                    raise LLMUnavailableError(
+                        f"Language model unavailable after {attempt + 1} attempts: {e}",
+                        retry_after=_retry_after(e),
+                    ) from e
+
+                # Full jitter, but never sooner than the provider asked
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                delay = max(delay, min(_retry_after(e) or 0.0, self.backoff_max))
+                self._increment("retries")
+                time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call and retry counters for this process."""
+        with self._lock:
+            counters = dict(self._counters)
+            counters["in_flight"] = self._in_flight
+        counters["max_concurrency"] = self.max_concurrency
+        return counters
+
+    def _call_once(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        with self._slots:
+            waited = time.perf_counter() - start
+            with self._lock:
+                self._in_flight += 1
+                self._counters["calls"] += 1
+                self._counters["wait_seconds_total"] += waited
+                self._counters["in_flight_peak"] = max(self._counters["in_flight_peak"], self._in_flight)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+    def _record_failure(self, error: Exception) -> None:
+        status_code = getattr(error, "status_code", None)
+        if status_code == 429:
+            self._increment("rate_limited")
+        elif status_code is not None and status_code >= 500:
+            self._increment("server_errors")
+
+    def _increment(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+
+# Global limiter instance
+llm_limiter = LLMCallLimiter(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    max_retries=settings.LLM_MAX_RETRIES,
+    backoff_base=settings.LLM_BACKOFF_BASE_SECONDS,
+    backoff_max=settings.LLM_BACKOFF_MAX_SECONDS,
+)
+
+_http_client: Optional[httpx.Client] = None
+_chat_models: Dict[float, Any] = {}
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """Return the keep-alive HTTP client shared by all chat models."""
+    global _http_client
+
+    with _client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+                    keepalive_expiry=settings.LLM_KEEPALIVE_SECONDS,
+                ),
+                timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=10.0),
+            )
+        return _http_client
+
+
+def get_chat_model(temperature: float = 0.1) -> Any:
+    """
+    Return the configured Azure OpenAI chat model for a temperature.
+
+    Models are created once and share the pooled HTTP client.
+    """
+    # Imported here so modules using only the limiter do not load langchain
+    from langchain_openai import AzureChatOpenAI
+
+    http_client = get_http_client()
+    with _client_lock:
+        model = _chat_models.get(temperature)
+        if model is None:
+            model = AzureChatOpenAI(
+                azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+                api_key=settings.AZURE_OPENAI_API_KEY,
+                deployment_name=settings.AZURE_OPENAI_DEPLOYMENT,
+                api_version=settings.AZURE_OPENAI_API_VERSION,
+                temperature=temperature,
+                http_client=http_client,
+                request_timeout=settings.LLM_TIMEOUT_SECONDS,
+                max_retries=0,
+            )
+            _chat_models[temperature] = model
+        return model
+
+
+def close_http_client() -> None:
+    """Close the shared HTTP client's connections."""
+    global _http_client
+
+    with _client_lock:
+        client, _http_client = _http_client, None
+        _chat_models.clear()
+    if client is not None:
+        client.close()
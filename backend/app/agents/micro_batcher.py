@@ -0,0 +1,99 @@
+"""
+Micro-batching of concurrent requests.
+
+Requests arriving within a short window of each other, from any thread,
+are handed to one batch call. The first request of a batch waits for the
+window to pass (or the batch to fill) and then runs the call on behalf of
+all of them; the others block until their own result is set. No
+background thread is involved.
+"""
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+
+class MicroBatcher(Generic[Item, Result]):
+    """Groups concurrent `submit` calls into batches for one handler call."""
+
+    def __init__(
+        self,
+        handler: Callable[[List[Item]], List[Result]],
+        max_size: int,
+        window_seconds: float,
+    ):
+        """
+        Args:
+            handler: Called with a batch of items, returns one result per item
+                in the same order
+            max_size: Items per batch; a full batch is sent without waiting
+            window_seconds: How long the first item of a batch waits for others
+        """
+        self.handler = handler
+        self.max_size = max_size
+        self.window_seconds = window_seconds
+        self._condition = threading.Condition()
+        self._open: Optional[List[Tuple[Item, Future]]] = None
+        self._counters = {"items": 0, "batches": 0, "largest_batch": 0}
+
+    def submit(self, item: Item) -> Result:
+        """
+        Add an item to the open batch and wait for its result.
+
+        Raises:
+            Exception: Whatever the handler raised for the batch
+        """
+        future: Future = Future()
+
+        with self._condition:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = []
+            batch.append((item, future))
+            if len(batch) >= self.max_size:
+                self._open = None
+                self._condition.notify_all()
+
+        if leader:
+            deadline = time.monotonic() + self.window_seconds
+            with self._condition:
+                while self._open is batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._open = None
+                        break
+                    self._condition.wait(remaining)
+            self._dispatch(batch)
+
+        return future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return batching counters for this process."""
+        with self._condition:
+            counters = dict(self._counters)
+        counters["avg_batch_size"] = (
+            round(counters["items"] / counters["batches"], 2) if counters["batches"] else 0.0
+        )
+        return counters
+
+    def _dispatch(self, batch: List[Tuple[Item, Future]]) -> None:
+        with self._condition:
+            self._counters["items"] += len(batch)
+            self._counters["batches"] += 1
+            self._counters["largest_batch"] = max(self._counters["largest_batch"], len(batch))
+
+        try:
+            results = self.handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch handler returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
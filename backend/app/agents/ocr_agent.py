@@ -1,28 +1,161 @@
 """
 OCR Agent for extracting data from invoices.
 """
-import json
-from typing import Dict, Any
+import mimetypes
+import xml.etree.ElementTree as ET
+from typing import Dict, Any, List, Optional
 from datetime import datetime
-from langchain_openai import AzureChatOpenAI
+from langchain_core.language_models import BaseChatModel
 from langchain.prompts import ChatPromptTemplate
 
-from app.core.config import settings
 from app.agents.state import InvoiceProcessingState
+from app.core.config import settings
+from app.agents.llm_cache import cached_invoke, cached_stream
+from app.agents.llm_client import LLMUnavailableError, get_chat_model
+from app.agents.einvoice import UnsupportedEInvoiceError, parse_einvoice
+from app.agents.document_text import DocumentTextExtractor
+from app.agents.text_compaction import compact_invoice_text
+from app.agents.stage_metrics import pipeline_metrics
+from app.agents.streaming_json import IncrementalJSONObjectParser
+from app.agents.duplicate_detector import duplicate_detector
+
+# Characters of an unrecognized XML document sent to the LLM
+XML_TEXT_LIMIT = 100_000
+
+# Extracted fields, in the order the extraction prompt lists them
+EXTRACTED_FIELDS = (
+    "invoice_number", "supplier_name", "supplier_tax_id", "invoice_date", "due_date",
+    "total_amount", "tax_amount", "net_amount", "currency", "po_number", "line_items",
+)
+
+
+class UnreadableDocumentError(ValueError):
+    """Raised when no text can be extracted from a document."""
+
+
+class ExtractionAborted(Exception):
+    """Raised while extracting when the document need not be extracted further."""
+
+    def __init__(self, reason: str, duplicate_of: Optional[int] = None):
+        """
+        Args:
+            reason: Why extraction stopped
+            duplicate_of: ID of the existing invoice, if the document is a duplicate
+        """
+        super().__init__(reason)
+        self.duplicate_of = duplicate_of
+
+
+def apply_extracted_field(state: InvoiceProcessingState, field: str, value: Any) -> None:
+    """
+    Store one extracted field in the state, converting amounts and dates.
+
+    Raises:
+        ValueError: If a date is not in ISO format or an amount is not numeric
+    """
+    if field in ("total_amount", "tax_amount", "net_amount"):
+        state[field] = float(value or 0)
+    elif field in ("invoice_date", "due_date"):
+        if value:
+            state[field] = datetime.fromisoformat(value)
+    elif field == "currency":
+        state[field] = value or "USD"
+    elif field == "line_items":
+        state[field] = value or []
+    else:
+        state[field] = value
+
+
+class ExtractionStream:
+    """
+    Applies streamed extraction fields to the state as they complete.
+
+    Cheap checks run on each field so that obviously bad documents stop the
+    completion early: no invoice number and no supplier, no total amount,
+    malformed dates, and an invoice number already booked for the supplier.
+    """
+
+    def __init__(self, state: InvoiceProcessingState):
+        """
+        Args:
+            state: Processing state to fill in
+        """
+        self.state = state
+        self.parser = IncrementalJSONObjectParser()
+        self.duplicate_checked = False
+
+    def reset(self) -> None:
+        """Start over, e.g. for a retried completion."""
+        self.parser.reset()
+        self.duplicate_checked = False
+
+    def feed(self, text: str) -> None:
+        """
+        Parse streamed text and check each completed field.
+
+        Raises:
+            ExtractionAborted: If the document should not be extracted further
+        """
+        for field, value in self.parser.feed(text):
+            if field in EXTRACTED_FIELDS:
+                apply_extracted_field(self.state, field, value)
+                self._check(field)
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Return all extracted fields.
+
+        Raises:
+            ValueError: If the answer ended before its JSON object was complete
+        """
+        if not self.parser.complete:
+            raise ValueError("Extraction answer is not a complete JSON object")
+        return self.parser.members
+
+    def _check(self, field: str) -> None:
+        members = self.parser.members
+
+        if (
+            field in ("invoice_number", "supplier_name")
+            and "invoice_number" in members and "supplier_name" in members
+            and not members["invoice_number"] and not members["supplier_name"]
+        ):
+            raise ExtractionAborted("No invoice number or supplier found, the document does not look like an invoice")
+
+        if field == "total_amount" and members["total_amount"] is None:
+            raise ExtractionAborted("No total amount found")
+
+        # Look for a duplicate as soon as the supplier and number are known
+        if self.duplicate_checked or field not in ("invoice_number", "supplier_name", "supplier_tax_id"):
+            return
+        if not members.get("invoice_number") or not ("supplier_tax_id" in members and "supplier_name" in members):
+            return
+
+        self.duplicate_checked = True
+        duplicate_of = duplicate_detector.find_invoice(
+            supplier_tax_id=members.get("supplier_tax_id"),
+            supplier_name=members.get("supplier_name"),
+            invoice_number=members["invoice_number"],
+        )
+        if duplicate_of is not None:
+            raise ExtractionAborted(
+                f"Duplicate of invoice {duplicate_of} (same supplier and invoice number)",
+                duplicate_of=duplicate_of,
+            )
 
 
 class OCRAgent:
     """Agent responsible for extracting data from invoice documents."""
 
-    def __init__(self):
-        """Initialize OCR agent with Azure OpenAI."""
-        self.llm = AzureChatOpenAI(
-            azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-            api_key=settings.AZURE_OPENAI_API_KEY,
-            deployment_name=settings.AZURE_OPENAI_DEPLOYMENT,
-            api_version=settings.AZURE_OPENAI_API_VERSION,
-            temperature=0.1,
-        )
+    def __init__(self, llm: Optional[BaseChatModel] = None):
+        """
+        Initialize OCR agent with Azure OpenAI.
+
+        Args:
+            llm: Chat model to use instead of the shared Azure OpenAI client
+        """
+        self.llm = llm if llm is not None else get_chat_model(temperature=0.1)
+        self.text_extractor = DocumentTextExtractor(self.llm)
 
         self.extraction_prompt = ChatPromptTemplate.from_messages([
             ("system", """You are an expert invoice data extraction AI.
@@ -57,88 +190,119 @@ class OCRAgent:
             Updated state with extracted data
         """
         try:
-            # Simulate document text extraction
-            # In production, use LlamaParse or Azure Document Intelligence
-            invoice_text = self._extract_text(state["document_path"])
+            extracted_data = None
 
-            # Extract structured data using LLM
-            chain = self.extraction_prompt | self.llm
-            response = chain.invoke({"invoice_text": invoice_text})
+            # Structured e-invoices are read directly, without the LLM
+            if state["document_format"] == "xml":
+                extracted_data = self._parse_einvoice(state["document_path"])
 
-            # Parse extracted data
-            extracted_data = json.loads(response.content)
+            if extracted_data is not None:
+                state["extraction_source"] = "einvoice"
+                confidence_score = 1.0
+            else:
+                pages = self._extract_pages(state["document_path"], state["document_format"])
+
+                # Keep only what the extracted fields need, within the token budget
+                compacted = compact_invoice_text(pages)
+                state["stage_metrics"] = {
+                    **(state.get("stage_metrics") or {}),
+                    "ocr": {
+                        "text_tokens_before": compacted.tokens_before,
+                        "text_tokens_after": compacted.tokens_after,
+                    },
+                }
+                pipeline_metrics.text_tokens.observe(compacted.tokens_before, stage="extracted")
+                pipeline_metrics.text_tokens.observe(compacted.tokens_after, stage="compacted")
+
+                # Extract structured data using LLM, checking fields as they arrive
+                extraction = ExtractionStream(state)
+                variables = {"invoice_text": compacted.text}
+                if settings.OCR_STREAMING_ENABLED:
+                    cached_stream(self.extraction_prompt, self.llm, variables, extraction)
+                else:
+                    content = cached_invoke(self.extraction_prompt, self.llm, variables)
+                    extraction.reset()
+                    extraction.feed(content)
+
+                extracted_data = extraction.finish()
+                state["extraction_source"] = "llm"
+                # High for structured extraction
+                confidence_score = 0.98
 
             # Update state with extracted data
-            state["invoice_number"] = extracted_data.get("invoice_number")
-            state["supplier_name"] = extracted_data.get("supplier_name")
-            state["supplier_tax_id"] = extracted_data.get("supplier_tax_id")
-            state["total_amount"] = float(extracted_data.get("total_amount", 0))
-            state["tax_amount"] = float(extracted_data.get("tax_amount", 0))
-            state["net_amount"] = float(extracted_data.get("net_amount", 0))
-            state["currency"] = extracted_data.get("currency", "USD")
-            state["po_number"] = extracted_data.get("po_number")
-            state["line_items"] = extracted_data.get("line_items", [])
-
-            # Parse dates
-            if extracted_data.get("invoice_date"):
-                state["invoice_date"] = datetime.fromisoformat(extracted_data["invoice_date"])
-            if extracted_data.get("due_date"):
-                state["due_date"] = datetime.fromisoformat(extracted_data["due_date"])
-
-            # Set confidence score (high for structured extraction)
-            state["confidence_score"] = 0.98
+            for field in EXTRACTED_FIELDS:
+                apply_extracted_field(state, field, extracted_data.get(field))
+
+            state["confidence_score"] = confidence_score
             state["current_step"] = "ocr_completed"
 
+        except LLMUnavailableError:
+            # Nothing can be extracted yet; let the job be retried later
+            raise
+        except ExtractionAborted as e:
+            state["confidence_score"] = 0.0
+            state["current_step"] = "ocr_aborted"
+            state["clarification_needed"] = True
+            state["clarification_message"] = str(e)
+            if e.duplicate_of is not None:
+                state["duplicate_detected"] = True
+                state["duplicate_of"] = e.duplicate_of
+                state["is_valid"] = False
+                state["validation_errors"] = [str(e)]
+            else:
+                state["processing_errors"].append(f"Extraction aborted: {str(e)}")
         except Exception as e:
             state["processing_errors"].append(f"OCR error: {str(e)}")
             state["confidence_score"] = 0.0
             state["current_step"] = "ocr_failed"
+            state["clarification_needed"] = True
+            state["clarification_message"] = f"Data could not be extracted: {str(e)}"
 
         return state
 
-    def _extract_text(self, document_path: str) -> str:
+    def _parse_einvoice(self, document_path: str) -> Optional[Dict[str, Any]]:
         """
-        Extract text from document.
-
-        In production, this would use:
-        - LlamaParse for complex PDFs
-        - Azure Document Intelligence
-        - OCR libraries
+        Extract a UBL or CII e-invoice without the LLM.
 
-        For now, returns simulated data.
+        Returns:
+            Extracted fields, or None if the XML is not a supported e-invoice
+            and has to go through the LLM
         """
-        # Simulated invoice text for demo
-        return """
-        INVOICE
-
-        Invoice Number: INV-2024-001
-        Invoice Date: 2024-01-15
-        Due Date: 2024-02-15
-
-        Supplier:
-        Tech Solutions Inc.
-        Tax ID: 12-3456789
+        try:
+            return parse_einvoice(document_path)
+        except (UnsupportedEInvoiceError, ET.ParseError):
+            return None
 
-        Bill To:
-        PERFO Corporation
+    def _extract_pages(self, document_path: str, document_format: str = "pdf") -> List[str]:
+        """
+        Extract the text of each document page.
 
-        Items:
-        1. Cloud Services - Monthly Subscription
-           Quantity: 1
-           Unit Price: $1,500.00
-           Total: $1,500.00
+        PDF pages are read from their text layer, and only scanned pages
+        and image uploads are transcribed by the chat model. XML documents
+        are passed as they are, truncated to XML_TEXT_LIMIT characters.
 
-        2. Support Package - Premium
-           Quantity: 1
-           Unit Price: $500.00
-           Total: $500.00
+        Raises:
+            OSError: If the document cannot be opened
+            PdfReadError: If a PDF is corrupt or truncated
+            UnreadableDocumentError: If the format cannot be read or no text
+                was found
+        """
+        if document_format == "xml":
+            with open(document_path, encoding="utf-8", errors="replace") as f:
+                return [f.read(XML_TEXT_LIMIT)]
 
-        Subtotal: $2,000.00
-        Tax (10%): $200.00
-        Total: $2,200.00
+        if document_format == "pdf":
+            pages = [page.text for page in self.text_extractor.iter_pdf_pages(document_path)]
+            if not any(page.strip() for page in pages):
+                raise UnreadableDocumentError("No text found in the PDF")
+            return pages
 
-        Purchase Order: PO-2024-045
+        mime_type = mimetypes.guess_type(f"document.{document_format}")[0]
+        if not (mime_type and mime_type.startswith("image/")):
+            raise UnreadableDocumentError(f"Unsupported document format: {document_format}")
+        if self.text_extractor.llm is None:
+            raise UnreadableDocumentError("Image documents need a vision model to be transcribed")
 
-        Payment Terms: Net 30
-        Early Payment Discount: 2% if paid within 10 days
-        """
+        with open(document_path, "rb") as f:
+            image = f.read()
+        return [self.text_extractor.transcribe(image, mime_type)[0]]
@@ -0,0 +1,49 @@
+"""
+Lazy access to the invoice processing pipeline.
+
+Building the pipeline imports langchain and langgraph, creates the LLM
+clients and compiles the workflow graph. It is deferred until the first
+invoice is processed (or a startup hook asks for it), so API workers that
+only serve reads never pay for it.
+"""
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
+
+from app.core.startup import startup_report
+
+if TYPE_CHECKING:
+    from app.agents.invoice_processor import InvoiceProcessor
+
+_processor: Optional["InvoiceProcessor"] = None
+_lock = threading.Lock()
+
+
+def get_invoice_processor() -> "InvoiceProcessor":
+    """Return the shared invoice processor, building it on first use."""
+    global _processor
+
+    if _processor is None:
+        with _lock:
+            if _processor is None:
+                start = time.perf_counter()
+                from app.agents.invoice_processor import InvoiceProcessor
+                startup_report.record("pipeline_import", time.perf_counter() - start)
+
+                with startup_report.phase("pipeline_build"):
+                    _processor = InvoiceProcessor()
+
+    return _processor
+
+
+def invoice_processor_ready() -> bool:
+    """Whether the pipeline has been built in this process."""
+    return _processor is not None
+
+
+def use_invoice_processor(processor: "InvoiceProcessor") -> None:
+    """Install a prebuilt processor, e.g. one backed by a fake LLM in benchmarks."""
+    global _processor
+
+    with _lock:
+        _processor = processor
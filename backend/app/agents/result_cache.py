@@ -0,0 +1,160 @@
+"""
+Content-hash cache of final processing results.
+
+The same PDF often reaches us through several channels (email, supplier
+portal, rescans of an unchanged file). Keying the final pipeline state by
+document hash and pipeline version lets those copies skip OCR, validation and
+coding entirely. Entries are stored in the database so they survive restarts
+and are shared by every worker.
+"""
+import hashlib
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import settings
+from app.agents.state import serialize_state, deserialize_state
+from app.db.session import SessionLocal
+from app.models.processing_cache import ProcessingResultCache
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Compute the SHA-256 digest of a file without loading it into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Persistent, size-bounded cache of processing results with hit/miss counters."""
+
+    def __init__(self, max_entries: int):
+        """
+        Args:
+            max_entries: Entries kept before least recently used ones are evicted
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+        self._errors = 0
+        self._writes_since_evict = 0
+
+    def get(self, document_hash: str, pipeline_version: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up the stored final state for a document.
+
+        Returns:
+            The cached state, or None on a miss or cache failure
+        """
+        db = SessionLocal()
+        try:
+            entry = db.query(ProcessingResultCache).filter(
+                ProcessingResultCache.document_hash == document_hash,
+                ProcessingResultCache.pipeline_version == pipeline_version
+            ).first()
+
+            if entry is None:
+                self._count("_misses")
+                return None
+
+            entry.hit_count = (entry.hit_count or 0) + 1
+            entry.last_used_at = datetime.utcnow()
+            result = entry.result
+            db.commit()
+        except SQLAlchemyError:
+            # A cache outage must never fail invoice processing
+            self._count("_errors")
+            return None
+        finally:
+            db.close()
+
+        self._count("_hits")
+        return deserialize_state(result)
+
+    def put(self, document_hash: str, pipeline_version: str, state: Dict[str, Any]) -> None:
+        """Store the final state for a document, evicting old entries if needed."""
+        db = SessionLocal()
+        try:
+            entry = db.query(ProcessingResultCache).filter(
+                ProcessingResultCache.document_hash == document_hash,
+                ProcessingResultCache.pipeline_version == pipeline_version
+            ).first()
+
+            if entry is None:
+                entry = ProcessingResultCache(
+                    document_hash=document_hash,
+                    pipeline_version=pipeline_version,
+                    hit_count=0
+                )
+                db.add(entry)
+
+            entry.result = serialize_state(state)
+            entry.last_used_at = datetime.utcnow()
+
+            # Counting and trimming the table on every store would dominate its cost
+            with self._lock:
+                self._writes_since_evict += 1
+                evict = self._writes_since_evict >= 100
+                if evict:
+                    self._writes_since_evict = 0
+
+            evicted = self._evict(db) if evict else 0
+            db.commit()
+        except SQLAlchemyError:
+            self._count("_errors")
+            return
+        finally:
+            db.close()
+
+        with self._lock:
+            self._stores += 1
+            self._evictions += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "stores": self._stores,
+                "evictions": self._evictions,
+                "errors": self._errors,
+                "max_entries": self.max_entries,
+            }
+
+    def _evict(self, db) -> int:
+        """Delete least recently used entries beyond `max_entries`, in the caller's transaction."""
+        excess = db.query(func.count(ProcessingResultCache.id)).scalar() - self.max_entries
+        if excess <= 0:
+            return 0
+
+        stale_ids = db.query(ProcessingResultCache.id).order_by(
+            ProcessingResultCache.last_used_at.asc()
+        ).limit(excess).subquery()
+
+        evicted = db.query(ProcessingResultCache).filter(
+            ProcessingResultCache.id.in_(stale_ids.select())
+        ).delete(synchronize_session=False)
+
+        return evicted
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+# Global cache instance, None when disabled
+result_cache = (
+    ResultCache(max_entries=settings.RESULT_CACHE_MAX_ENTRIES)
+    if settings.RESULT_CACHE_ENABLED else None
+)
@@ -0,0 +1,150 @@
+"""
+Latency and token accounting for the processing pipeline.
+
+Every graph node is wrapped so that its wall time and the LLM tokens it
+used are recorded in the processing state (and so stored with the
+invoice) and in process-wide histograms exported in the Prometheus text
+format.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered like a Prometheus histogram."""
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float]):
+        """
+        Args:
+            name: Metric name
+            description: Help text
+            buckets: Upper bounds of the buckets, ascending
+        """
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record an observation for the given label values."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+                self._series[key] = series
+            series["counts"][bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> List[str]:
+        """Render the histogram in the Prometheus text exposition format."""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+
+        with self._lock:
+            series = {key: dict(value, counts=list(value["counts"])) for key, value in self._series.items()}
+
+        for labels, data in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), data["counts"]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(data['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {data['count']}")
+
+        return lines
+
+
+class PipelineMetrics:
+    """Process-wide histograms of pipeline and node latency and token use."""
+
+    def __init__(self):
+        """Initialize empty histograms."""
+        self.invoice_seconds = Histogram(
+            "invoice_pipeline_duration_seconds",
+            "Time to process one invoice, by source (pipeline, cache, duplicate).",
+            LATENCY_BUCKETS,
+        )
+        self.node_seconds = Histogram(
+            "invoice_pipeline_node_duration_seconds",
+            "Time spent in each pipeline node.",
+            LATENCY_BUCKETS,
+        )
+        self.node_tokens = Histogram(
+            "invoice_pipeline_node_llm_tokens",
+            "LLM tokens used per node execution, by token type.",
+            TOKEN_BUCKETS,
+        )
+        self.text_tokens = Histogram(
+            "invoice_text_tokens",
+            "Tokens of invoice text before (extracted) and after (compacted) compaction.",
+            TOKEN_BUCKETS,
+        )
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for histogram in (self.invoice_seconds, self.node_seconds, self.node_tokens, self.text_tokens):
+            lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics instance
+pipeline_metrics = PipelineMetrics()
+
+
+def timed_node(name: str, node: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Callable:
+    """
+    Wrap a graph node with timing and LLM token accounting.
+
+    The measurements are added to `stage_metrics` in the returned state and
+    observed in `pipeline_metrics`.
+    """
+    # Imported here so the metrics endpoint does not load langchain
+    from langchain_community.callbacks import get_openai_callback
+
+    def run(state: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        with get_openai_callback() as usage:
+            result = node(state)
+        seconds = time.perf_counter() - start
+
+        stage = {
+            "seconds": round(seconds, 6),
+            "llm_calls": usage.successful_requests,
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+        }
+        # Keep what the node itself recorded under its name
+        stage_metrics = {**(state.get("stage_metrics") or {}), **(result.get("stage_metrics") or {})}
+        result["stage_metrics"] = {**stage_metrics, name: {**stage_metrics.get(name, {}), **stage}}
+
+        pipeline_metrics.node_seconds.observe(seconds, node=name)
+        if usage.successful_requests:
+            pipeline_metrics.node_tokens.observe(usage.prompt_tokens, node=name, type="prompt")
+            pipeline_metrics.node_tokens.observe(usage.completion_tokens, node=name, type="completion")
+
+        return result
+
+    run.__name__ = f"{name}_timed"
+    return run
@@ -4,6 +4,9 @@ Agent state definitions for LangGraph.
 from typing import TypedDict, Optional, List, Dict, Any
 from datetime import datetime
 
+# State fields holding datetimes, stored as ISO strings when serialized
+DATETIME_FIELDS = ("invoice_date", "due_date", "processed_at")
+
 
 class InvoiceProcessingState(TypedDict):
     """State for invoice processing workflow."""
@@ -12,6 +15,7 @@ class InvoiceProcessingState(TypedDict):
     document_path: str
     document_format: str
     document_content: Optional[bytes]
+    document_hash: Optional[str]  # SHA-256 of the document bytes
 
     # Extracted data
     invoice_number: Optional[str]
@@ -25,6 +29,7 @@ class InvoiceProcessingState(TypedDict):
     currency: Optional[str]
     po_number: Optional[str]
     line_items: Optional[List[Dict[str, Any]]]
+    extraction_source: Optional[str]  # einvoice, llm
 
     # Validation results
     validation_errors: List[str]
@@ -32,6 +37,7 @@ class InvoiceProcessingState(TypedDict):
     is_valid: bool
     fraud_detected: bool
     duplicate_detected: bool
+    duplicate_of: Optional[int]  # ID of the existing invoice, if duplicate
 
     # Matching results
     po_matched: bool
@@ -42,6 +48,8 @@ class InvoiceProcessingState(TypedDict):
     gl_account: Optional[str]
     cost_center: Optional[str]
     accounting_entries: Optional[List[Dict[str, Any]]]
+    coding_source: Optional[str]  # index, llm, rules
+    coding_confidence: Optional[float]  # Agreement of historical codings, if from index
 
     # Approval workflow
     requires_approval: bool
@@ -58,3 +66,24 @@ class InvoiceProcessingState(TypedDict):
     # Metadata
     processed_at: Optional[datetime]
     processing_time: Optional[float]
+    stage_metrics: Optional[Dict[str, Dict[str, Any]]]  # Per-node seconds and LLM token use
+    from_cache: bool  # Result reused from an identical, previously processed document
+
+
+def serialize_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a processing state into a JSON-serializable dict."""
+    data = {key: value for key, value in state.items() if key != "document_content"}
+    for field in DATETIME_FIELDS:
+        if isinstance(data.get(field), datetime):
+            data[field] = data[field].isoformat()
+    return data
+
+
+def deserialize_state(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild a processing state from its serialized form."""
+    state = dict(data)
+    state.setdefault("document_content", None)
+    for field in DATETIME_FIELDS:
+        if isinstance(state.get(field), str):
+            state[field] = datetime.fromisoformat(state[field])
+    return state
@@ -0,0 +1,100 @@
+"""
+Incremental parsing of a streamed JSON object.
+
+LLM answers arrive in small chunks. The parser reports each top-level
+member of the answer object as soon as its value is complete, so callers
+can act on early fields while the rest of the answer is still being
+generated. Text before the opening brace (such as a code fence) is skipped.
+"""
+import json
+from typing import Any, Dict, List, Tuple
+
+_decoder = json.JSONDecoder()
+
+
+class IncrementalJSONObjectParser:
+    """Yields (key, value) pairs of a JSON object as its text is fed in."""
+
+    def __init__(self):
+        """Start with an empty buffer."""
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything fed so far, e.g. before a retried stream."""
+        self._buffer = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._member_start = None
+        self.members: Dict[str, Any] = {}
+        self.complete = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        Add streamed text.
+
+        Returns:
+            Members completed by this text, in order
+
+        Raises:
+            ValueError: If a completed member is not valid JSON
+        """
+        if self.complete:
+            return []
+
+        self._buffer += text
+        completed = []
+        buffer = self._buffer
+
+        while self._position < len(buffer):
+            char = buffer[self._position]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+
+            elif self._member_start is None:
+                # Before the object starts
+                if char == "{":
+                    self._depth = 1
+                    self._member_start = self._position + 1
+
+            elif char == '"':
+                self._in_string = True
+
+            elif char in "{[":
+                self._depth += 1
+
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete_member(buffer[self._member_start:self._position], completed)
+                    self.complete = True
+                    break
+
+            elif char == "," and self._depth == 1:
+                self._complete_member(buffer[self._member_start:self._position], completed)
+                self._member_start = self._position + 1
+
+            self._position += 1
+
+        return completed
+
+    def _complete_member(self, text: str, completed: List[Tuple[str, Any]]) -> None:
+        text = text.strip()
+        if not text:
+            return
+
+        key, end = _decoder.raw_decode(text)
+        rest = text[end:].lstrip()
+        if not isinstance(key, str) or not rest.startswith(":"):
+            raise ValueError(f"Malformed JSON member: {text[:80]}")
+
+        value = json.loads(rest[1:])
+        self.members[key] = value
+        completed.append((key, value))
@@ -0,0 +1,201 @@
+"""
+Token-budgeted compaction of invoice text before LLM extraction.
+
+Extracted text carries a lot that no extracted field needs: layout
+whitespace, page headers and footers repeated on every page, terms and
+conditions, remittance and bank details. Compaction normalizes whitespace,
+drops repeated page furniture and, when the text is still over budget,
+keeps the lines most likely to hold invoice fields, in their original
+order.
+"""
+import re
+import threading
+from typing import List, NamedTuple, Optional
+
+from app.core.config import settings
+
+# Lines at the top and bottom of a page checked for repeated headers/footers
+PAGE_FURNITURE_LINES = 3
+
+# Lines at the start of the document, where supplier and invoice identity usually are
+LEADING_LINES = 10
+
+FIELD_KEYWORDS = re.compile(
+    r"invoice|factura|bill|date|due|total|subtotal|net|tax|vat|iva|gst|amount|"
+    r"qty|quantity|price|unit|po\b|p\.o\.|purchase order|order|supplier|vendor|"
+    r"seller|from|id\b|no\.|number|currency|usd|eur|description|item",
+    re.IGNORECASE,
+)
+BOILERPLATE_HEADINGS = re.compile(
+    r"^(terms( and|\s*&)? conditions|general terms|remittance|remit to|bank details|"
+    r"banking details|payment instructions|wire transfer|privacy|disclaimer)\b",
+    re.IGNORECASE,
+)
+AMOUNT = re.compile(r"\d")
+PAGE_NUMBER = re.compile(r"\b(page|p[áa]g(ina)?\.?)\s*\d+(\s*(of|de|/)\s*\d+)?|^\W*\d+\s*(/\s*\d+)?\W*$", re.IGNORECASE)
+HORIZONTAL_SPACE = re.compile(r"[ \t\u00a0]+")
+
+
+class CompactedText(NamedTuple):
+    """Compacted text with its token counts before and after."""
+
+    text: str
+    tokens_before: int
+    tokens_after: int
+
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """
+    Load the tokenizer of the configured model once.
+
+    tiktoken downloads its vocabulary on first use (or reads it from
+    TIKTOKEN_CACHE_DIR); if that fails, token counts are estimated.
+    """
+    global _encoding, _encoding_loaded
+
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+
+                    try:
+                        _encoding = tiktoken.encoding_for_model(settings.AZURE_OPENAI_MODEL)
+                    except KeyError:
+                        _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    _encoding = None
+                _encoding_loaded = True
+
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens of `text` for the configured model."""
+    encoding = _get_encoding()
+    if encoding is None:
+        # Roughly four characters per token for English text
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _normalize(page: str) -> List[str]:
+    """Collapse horizontal whitespace and runs of blank lines."""
+    lines = []
+    for line in page.splitlines():
+        line = HORIZONTAL_SPACE.sub(" ", line).strip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _furniture_key(line: str) -> str:
+    """Compare page headers and footers regardless of their page number."""
+    return PAGE_NUMBER.sub("#", line)
+
+
+def _repeated_furniture(pages: List[List[str]]) -> set:
+    """Lines found at the top or bottom of more than half of the pages."""
+    if len(pages) < 2:
+        return set()
+
+    counts = {}
+    for lines in pages:
+        content = [line for line in lines if line]
+        edge = set(content[:PAGE_FURNITURE_LINES] + content[-PAGE_FURNITURE_LINES:])
+        for line in edge:
+            key = _furniture_key(line)
+            counts[key] = counts.get(key, 0) + 1
+
+    return {key for key, count in counts.items() if count > len(pages) / 2}
+
+
+def _drop_boilerplate(lines: List[str]) -> List[str]:
+    """Drop sections under boilerplate headings, up to the next blank line."""
+    kept = []
+    skipping = False
+    for line in lines:
+        if not line:
+            skipping = False
+        elif BOILERPLATE_HEADINGS.match(line):
+            skipping = True
+        if not skipping:
+            kept.append(line)
+    return kept
+
+
+def _score(index: int, line: str) -> int:
+    """How likely a line is to hold an extracted field."""
+    score = 0
+    if index < LEADING_LINES:
+        score += 1
+    if FIELD_KEYWORDS.search(line):
+        score += 2
+    if AMOUNT.search(line):
+        score += 1
+    return score
+
+
+def compact_invoice_text(pages: List[str], token_budget: Optional[int] = None) -> CompactedText:
+    """
+    Compact extracted invoice text to fit a token budget.
+
+    Args:
+        pages: Text of each document page, in order
+        token_budget: Maximum tokens of the result (default: OCR_PROMPT_TOKEN_BUDGET),
+            0 to only normalize whitespace and drop repeated page furniture
+
+    Returns:
+        The compacted text and its token counts before and after
+    """
+    if token_budget is None:
+        token_budget = settings.OCR_PROMPT_TOKEN_BUDGET
+
+    tokens_before = count_tokens("\n\n".join(pages))
+
+    normalized = [_normalize(page) for page in pages]
+    furniture = _repeated_furniture(normalized)
+
+    lines: List[str] = []
+    seen_furniture = set()
+    for page_lines in normalized:
+        for line in page_lines:
+            key = _furniture_key(line)
+            if key in furniture:
+                # Keep the first occurrence, it may carry the supplier's name
+                if key in seen_furniture:
+                    continue
+                seen_furniture.add(key)
+            lines.append(line)
+        if lines and lines[-1]:
+            lines.append("")
+
+    text = "\n".join(lines).strip()
+    tokens_after = count_tokens(text)
+
+    if token_budget and tokens_after > token_budget:
+        lines = [line for line in _drop_boilerplate(lines) if line]
+
+        # Keep the best scoring lines that fit, in their original order
+        ranked = sorted(range(len(lines)), key=lambda index: (-_score(index, lines[index]), index))
+        kept = set()
+        used = 0
+        for index in ranked:
+            # One extra token for the line break
+            cost = count_tokens(lines[index]) + 1
+            if used + cost > token_budget:
+                continue
+            kept.add(index)
+            used += cost
+
+        text = "\n".join(lines[index] for index in sorted(kept))
+        tokens_after = count_tokens(text)
+
+    return CompactedText(text, tokens_before, tokens_after)
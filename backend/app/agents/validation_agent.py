@@ -2,26 +2,14 @@
 Validation Agent for verifying invoice data.
 """
 from typing import List
-from langchain_openai import AzureChatOpenAI
-from langchain.prompts import ChatPromptTemplate
 
-from app.core.config import settings
 from app.agents.state import InvoiceProcessingState
+from app.agents.duplicate_detector import duplicate_detector
 
 
 class ValidationAgent:
     """Agent responsible for validating invoice data."""
 
-    def __init__(self):
-        """Initialize validation agent."""
-        self.llm = AzureChatOpenAI(
-            azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-            api_key=settings.AZURE_OPENAI_API_KEY,
-            deployment_name=settings.AZURE_OPENAI_DEPLOYMENT,
-            api_version=settings.AZURE_OPENAI_API_VERSION,
-            temperature=0,
-        )
-
     def process(self, state: InvoiceProcessingState) -> InvoiceProcessingState:
         """
         Validate invoice data.
@@ -126,12 +114,23 @@ class ValidationAgent:
 
     def _check_duplicate(self, state: InvoiceProcessingState) -> bool:
         """
-        Check for duplicate invoices.
+        Check for an existing invoice with the same supplier and number.
 
-        In production, query database for existing invoice with same number.
+        Records the matching invoice ID in `duplicate_of`.
         """
-        # Simulated check - in production, query database
-        return False
+        duplicate_of = duplicate_detector.find_invoice(
+            supplier_tax_id=state.get("supplier_tax_id"),
+            supplier_name=state.get("supplier_name"),
+            invoice_number=state.get("invoice_number"),
+            total_amount=state.get("total_amount"),
+            invoice_date=state.get("invoice_date"),
+        )
+
+        if duplicate_of is None:
+            return False
+
+        state["duplicate_of"] = duplicate_of
+        return True
 
     def _detect_fraud(self, state: InvoiceProcessingState) -> List[str]:
         """
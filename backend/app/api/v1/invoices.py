@@ -1,145 +1,296 @@
 """
 Invoice API endpoints.
 """
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, UploadFile, File
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from starlette.concurrency import run_in_threadpool
 import os
-from datetime import datetime, timedelta
+import shutil
+import zipfile
+from datetime import datetime, timedelta, timezone
 
-from app.core.security import get_current_user, require_role
-from app.db.session import get_db
+from app.core.security import get_current_user, get_current_user_async, require_role
+from app.db.session import get_db, get_async_db
+from app.db.pagination import NEXT_CURSOR_HEADER, InvalidCursorError, keyset_page, response_columns
 from app.models.user import User
 from app.models.invoice import Invoice
-from app.models.supplier import Supplier
+from app.models.invoice_extraction import InvoiceExtraction
 from app.schemas.invoice import (
     InvoiceResponse,
+    InvoiceExtractionResponse,
     InvoiceUpdate,
+    InvoiceJobResponse,
     InvoiceStats,
     DashboardMetrics
 )
-from app.agents.invoice_processor import invoice_processor
+from app.services.invoice_service import process_uploaded_invoice, process_uploaded_batch
+from app.services.extractions import decode_extraction, UnsupportedExtractionVersionError
+from app.services.invoice_stats import invoice_snapshot, invoice_stats, record_invoice_changes
+from app.services.jobs import job_manager, JobQueueFullError
+from app.services.uploads import save_upload, extract_zip, UploadTooLargeError
 from app.core.config import settings
 
 router = APIRouter()
 
+ALLOWED_EXTENSIONS = [".pdf", ".xml", ".png", ".jpg", ".jpeg"]
 
-@router.post("/upload", response_model=InvoiceResponse)
+
+def processing_enabled():
+    """Reject uploads on workers that do not run the processing pipeline."""
+    if not settings.INVOICE_PROCESSING_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Invoice processing is disabled on this worker"
+        )
+
+
+@router.post(
+    "/upload",
+    response_model=InvoiceJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(processing_enabled)]
+)
 async def upload_invoice(
+    response: Response,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Upload and process an invoice document.
+    Upload an invoice document and queue it for AI processing.
+
+    Returns immediately with a job; poll `GET /invoices/jobs/{job_id}`
+    for the processing outcome.
     """
     # Validate file type
-    allowed_extensions = [".pdf", ".xml", ".png", ".jpg", ".jpeg"]
     file_ext = os.path.splitext(file.filename)[1].lower()
 
-    if file_ext not in allowed_extensions:
+    if file_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type {file_ext} not allowed. Allowed: {allowed_extensions}"
+            detail=f"File type {file_ext} not allowed. Allowed: {ALLOWED_EXTENSIONS}"
         )
 
-    # Save file
+    # Stream file to disk, hashing it on the way
     upload_dir = settings.UPLOAD_DIR
     os.makedirs(upload_dir, exist_ok=True)
 
-    file_path = os.path.join(upload_dir, f"{datetime.now().timestamp()}_{file.filename}")
+    file_path = os.path.join(
+        upload_dir, f"{datetime.now().timestamp()}_{os.path.basename(file.filename)}"
+    )
 
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    try:
+        _, document_hash = await save_upload(
+            file,
+            file_path,
+            max_size=settings.MAX_UPLOAD_SIZE,
+            chunk_size=settings.UPLOAD_CHUNK_SIZE,
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
 
-    # Process invoice using AI agents
-    processing_result = invoice_processor.process_invoice(
-        document_path=file_path,
-        document_format=file_ext[1:]  # Remove leading dot
-    )
+    # Process invoice using AI agents in the background
+    try:
+        job = job_manager.submit(
+            "invoice",
+            process_uploaded_invoice,
+            file_path,
+            file_ext[1:],  # Remove leading dot
+            current_user.id,
+            document_hash,
+            filename=file.filename,
+        )
+    except JobQueueFullError as e:
+        os.remove(file_path)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
 
-    # Find or create supplier
-    supplier = db.query(Supplier).filter(
-        Supplier.tax_id == processing_result.get("supplier_tax_id")
-    ).first()
-
-    if not supplier:
-        supplier = Supplier(
-            name=processing_result.get("supplier_name", "Unknown"),
-            tax_id=processing_result.get("supplier_tax_id", f"TEMP-{datetime.now().timestamp()}"),
-            is_active=True,
-            is_verified=False
+    response.headers["Location"] = f"{settings.API_V1_STR}/invoices/jobs/{job.job_id}"
+    return job.to_dict()
+
+
+@router.post(
+    "/upload/batch",
+    response_model=InvoiceJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(processing_enabled)]
+)
+async def upload_invoice_batch(
+    response: Response,
+    files: List[UploadFile] = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Upload many invoice documents, or ZIP archives of them, as one batch.
+
+    Documents are processed in parallel in the background and stored
+    together; the finished job carries a per-document manifest.
+    """
+    accepted_extensions = ALLOWED_EXTENSIONS + [".zip"]
+    for file in files:
+        file_ext = os.path.splitext(file.filename)[1].lower()
+        if file_ext not in accepted_extensions:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File type {file_ext} not allowed in {file.filename}. Allowed: {accepted_extensions}"
+            )
+
+    batch_dir = os.path.join(settings.UPLOAD_DIR, f"batch_{datetime.now().timestamp()}")
+    os.makedirs(batch_dir, exist_ok=True)
+
+    documents = []
+    total_size = 0
+
+    try:
+        for index, file in enumerate(files):
+            filename = os.path.basename(file.filename)
+            file_ext = os.path.splitext(filename)[1].lower()
+            file_path = os.path.join(batch_dir, f"{index}_{filename}")
+
+            # Stream file to disk within what is left of the batch budget
+            size, document_hash = await save_upload(
+                file,
+                file_path,
+                max_size=settings.MAX_BATCH_UPLOAD_SIZE - total_size,
+                chunk_size=settings.UPLOAD_CHUNK_SIZE,
+            )
+            total_size += size
+
+            if file_ext == ".zip":
+                # Decompressed documents count against the same batch budget
+                extracted, extracted_size = await run_in_threadpool(
+                    extract_zip,
+                    file_path,
+                    batch_dir,
+                    ALLOWED_EXTENSIONS,
+                    settings.MAX_BATCH_DOCUMENTS - len(documents),
+                    settings.MAX_BATCH_UPLOAD_SIZE - total_size,
+                    settings.UPLOAD_CHUNK_SIZE,
+                )
+                total_size += extracted_size
+                os.remove(file_path)
+                documents.extend(extracted)
+            else:
+                documents.append({
+                    "filename": filename,
+                    "document_path": file_path,
+                    "document_format": file_ext[1:],
+                    "document_hash": document_hash,
+                })
+
+            if len(documents) > settings.MAX_BATCH_DOCUMENTS:
+                raise UploadTooLargeError(
+                    f"Batch contains more than {settings.MAX_BATCH_DOCUMENTS} documents"
+                )
+
+        if not documents:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Batch contains no invoice documents"
+            )
+
+        job = job_manager.submit(
+            "invoice_batch",
+            process_uploaded_batch,
+            documents,
+            current_user.id,
+            filename=f"{len(documents)} documents",
         )
-        db.add(supplier)
-        db.commit()
-        db.refresh(supplier)
-
-    # Create invoice record
-    invoice = Invoice(
-        invoice_number=processing_result.get("invoice_number", f"INV-{datetime.now().timestamp()}"),
-        supplier_id=supplier.id,
-        invoice_date=processing_result.get("invoice_date", datetime.now()),
-        due_date=processing_result.get("due_date", datetime.now() + timedelta(days=30)),
-        total_amount=processing_result.get("total_amount", 0),
-        tax_amount=processing_result.get("tax_amount", 0),
-        net_amount=processing_result.get("net_amount", 0),
-        currency=processing_result.get("currency", "USD"),
-        po_number=processing_result.get("po_number"),
-        po_matched=processing_result.get("po_matched", False),
-        status="pending" if processing_result.get("requires_approval") else "approved",
-        processing_status=processing_result.get("processing_status", "completed"),
-        confidence_score=processing_result.get("confidence_score", 0.0),
-        is_touchless=processing_result.get("is_touchless", False),
-        extracted_data=processing_result,
-        validation_errors=processing_result.get("validation_errors"),
-        gl_account=processing_result.get("gl_account"),
-        cost_center=processing_result.get("cost_center"),
-        document_path=file_path,
-        document_format=file_ext[1:],
-        approval_status="pending" if processing_result.get("requires_approval") else "approved",
-        approved_by=None if processing_result.get("requires_approval") else current_user.id,
-        approved_at=None if processing_result.get("requires_approval") else datetime.now(),
-    )
 
-    db.add(invoice)
-    db.commit()
-    db.refresh(invoice)
+    except UploadTooLargeError as e:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except zipfile.BadZipFile:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid ZIP archive"
+        )
+    except JobQueueFullError as e:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
+    except HTTPException:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        raise
+
+    response.headers["Location"] = f"{settings.API_V1_STR}/invoices/jobs/{job.job_id}"
+    return job.to_dict()
 
-    return invoice
+
+@router.get("/jobs/{job_id}", response_model=InvoiceJobResponse)
+async def get_invoice_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    Get the status of an invoice processing job.
+    """
+    job = job_manager.get(job_id)
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+
+    return job.to_dict()
 
 
 @router.get("/", response_model=List[InvoiceResponse])
-def list_invoices(
-    skip: int = 0,
-    limit: int = 100,
+async def list_invoices(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
     status: str = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
-    List all invoices with optional filtering.
+    List invoices, newest first, with optional filtering.
+
+    The cursor of the next page is returned in the X-Next-Cursor header.
     """
-    query = db.query(Invoice)
+    statement = select(Invoice).options(response_columns(Invoice, InvoiceResponse))
 
     if status:
-        query = query.filter(Invoice.status == status)
+        statement = statement.where(Invoice.status == status)
+
+    try:
+        invoices, next_cursor = await db.run_sync(keyset_page, statement, Invoice, cursor, limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
-    invoices = query.offset(skip).limit(limit).all()
     return invoices
 
 
 @router.get("/{invoice_id}", response_model=InvoiceResponse)
-def get_invoice(
+async def get_invoice(
     invoice_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
     Get invoice by ID.
     """
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+    invoice = await db.get(Invoice, invoice_id, options=[response_columns(Invoice, InvoiceResponse)])
 
     if not invoice:
         raise HTTPException(
@@ -150,6 +301,39 @@ def get_invoice(
     return invoice
 
 
+@router.get("/{invoice_id}/extraction", response_model=InvoiceExtractionResponse)
+async def get_invoice_extraction(
+    invoice_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    Get the full AI extraction result of an invoice.
+    """
+    extraction = await db.get(InvoiceExtraction, invoice_id)
+
+    if not extraction:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Extraction not found"
+        )
+
+    try:
+        data = decode_extraction(extraction.data, extraction.schema_version)
+    except UnsupportedExtractionVersionError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+    return {
+        "invoice_id": extraction.invoice_id,
+        "schema_version": extraction.schema_version,
+        "created_at": extraction.created_at,
+        "data": data
+    }
+
+
 @router.put("/{invoice_id}", response_model=InvoiceResponse)
 def update_invoice(
     invoice_id: int,
@@ -168,10 +352,13 @@ def update_invoice(
             detail="Invoice not found"
         )
 
+    before = invoice_snapshot(invoice)
+
     # Update fields
     for field, value in invoice_data.dict(exclude_unset=True).items():
         setattr(invoice, field, value)
 
+    record_invoice_changes(db, [(before, invoice_snapshot(invoice))])
     db.commit()
     db.refresh(invoice)
 
@@ -195,11 +382,14 @@ def approve_invoice(
             detail="Invoice not found"
         )
 
+    before = invoice_snapshot(invoice)
+
     invoice.approval_status = "approved"
     invoice.status = "approved"
     invoice.approved_by = current_user.id
     invoice.approved_at = datetime.now()
 
+    record_invoice_changes(db, [(before, invoice_snapshot(invoice))])
     db.commit()
     db.refresh(invoice)
 
@@ -224,12 +414,15 @@ def reject_invoice(
             detail="Invoice not found"
         )
 
+    before = invoice_snapshot(invoice)
+
     invoice.approval_status = "rejected"
     invoice.status = "rejected"
     invoice.rejection_reason = reason
     invoice.approved_by = current_user.id
     invoice.approved_at = datetime.now()
 
+    record_invoice_changes(db, [(before, invoice_snapshot(invoice))])
     db.commit()
     db.refresh(invoice)
 
@@ -237,63 +430,43 @@ def reject_invoice(
 
 
 @router.get("/stats/overview", response_model=InvoiceStats)
-def get_invoice_stats(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_invoice_stats(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
     Get invoice statistics.
     """
-    total_invoices = db.query(func.count(Invoice.id)).scalar()
-    pending_invoices = db.query(func.count(Invoice.id)).filter(Invoice.status == "pending").scalar()
-    approved_invoices = db.query(func.count(Invoice.id)).filter(Invoice.status == "approved").scalar()
-    rejected_invoices = db.query(func.count(Invoice.id)).filter(Invoice.status == "rejected").scalar()
+    stats = await db.run_sync(invoice_stats, datetime.now(timezone.utc).date() - timedelta(days=30))
 
-    touchless_invoices = db.query(func.count(Invoice.id)).filter(Invoice.is_touchless == True).scalar()
-    touchless_rate = (touchless_invoices / total_invoices * 100) if total_invoices > 0 else 0
+    total_invoices = int(stats["total"])
+    touchless_rate = (stats["touchless"] / total_invoices * 100) if total_invoices > 0 else 0
+    processed = stats["processing_time_count"]
+    avg_processing_time = stats["processing_time_sum"] / processed if processed > 0 else 0
 
     return {
-        "total_invoices": total_invoices or 0,
-        "pending_invoices": pending_invoices or 0,
-        "approved_invoices": approved_invoices or 0,
-        "rejected_invoices": rejected_invoices or 0,
+        "total_invoices": total_invoices,
+        "pending_invoices": int(stats["status:pending"]),
+        "approved_invoices": int(stats["status:approved"]),
+        "rejected_invoices": int(stats["status:rejected"]),
         "touchless_rate": round(touchless_rate, 2),
-        "avg_processing_time": 2.5  # Simulated
+        "avg_processing_time": round(avg_processing_time, 2)
     }
 
 
 @router.get("/dashboard/metrics", response_model=DashboardMetrics)
-def get_dashboard_metrics(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_dashboard_metrics(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
     Get dashboard metrics for home page.
     """
-    # Get invoices from last 30 days
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-
-    incoming_invoices = db.query(func.count(Invoice.id)).filter(
-        Invoice.created_at >= thirty_days_ago
-    ).scalar() or 0
-
-    touchless_invoices = db.query(func.count(Invoice.id)).filter(
-        and_(
-            Invoice.is_touchless == True,
-            Invoice.created_at >= thirty_days_ago
-        )
-    ).scalar() or 0
-
-    touchless_rate = (touchless_invoices / incoming_invoices * 100) if incoming_invoices > 0 else 0
-
-    pending_clarifications = db.query(func.count(Invoice.id)).filter(
-        Invoice.processing_status == "pending_clarification"
-    ).scalar() or 0
+    # Invoices from last 30 days
+    stats = await db.run_sync(invoice_stats, datetime.now(timezone.utc).date() - timedelta(days=30))
 
-    # Calculate DPO (simplified)
-    total_payables = db.query(func.sum(Invoice.total_amount)).filter(
-        Invoice.status.in_(["pending", "approved"])
-    ).scalar() or 0
+    incoming_invoices = int(stats["incoming_since"])
+    touchless_rate = (stats["touchless_since"] / incoming_invoices * 100) if incoming_invoices > 0 else 0
 
     return {
         "incoming_invoices": incoming_invoices,
@@ -301,5 +474,5 @@ def get_dashboard_metrics(
         "days_payable_outstanding": 45.0,  # Simulated
         "realized_cash_discounts": 2.3,  # Simulated (in %)
         "invoice_cycle_time": 2.8,  # Simulated (in days)
-        "pending_clarifications": pending_clarifications
+        "pending_clarifications": int(stats["pending_clarification"])
     }
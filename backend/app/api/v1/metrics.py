@@ -0,0 +1,86 @@
+"""
+Operational metrics API endpoints.
+"""
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.core.security import require_role
+from app.core.user_cache import user_cache
+from app.models.user import User
+from app.agents.pipeline import get_invoice_processor, invoice_processor_ready
+from app.agents.result_cache import result_cache
+from app.agents.llm_cache import llm_cache
+from app.agents.stage_metrics import pipeline_metrics
+from app.db.pool_metrics import sync_pool_metrics, async_pool_metrics
+from app.services.supplier_cache import supplier_cache
+
+router = APIRouter()
+
+
+@router.get("/cache")
+def get_cache_metrics(
+    current_user: User = Depends(require_role(["admin"]))
+):
+    """
+    Get processing result, LLM response, page transcription, user and
+    supplier cache counters for this worker.
+    """
+    # Imported here so the metrics endpoints do not load pypdf and langchain at startup
+    from app.agents.document_text import page_text_cache
+
+    # Reported only once built; metrics must not trigger pipeline construction
+    pipeline_version = (
+        get_invoice_processor().pipeline_version if invoice_processor_ready() else None
+    )
+
+    return {
+        "pipeline_version": pipeline_version,
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        "llm_cache": llm_cache.stats(),
+        "page_text_cache": page_text_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "supplier_cache": supplier_cache.stats(),
+    }
+
+
+@router.get("/db-pool")
+def get_db_pool_metrics(
+    current_user: User = Depends(require_role(["admin"]))
+):
+    """
+    Get connection pool usage of this worker's database engines.
+    """
+    return {
+        "sync": sync_pool_metrics.stats(),
+        "async": async_pool_metrics.stats(),
+    }
+
+
+@router.get("/llm")
+def get_llm_metrics(
+    current_user: User = Depends(require_role(["admin"]))
+):
+    """
+    Get model call concurrency, retry and coding batch counters for this worker.
+    """
+    from app.agents.llm_client import llm_limiter
+
+    batcher = get_invoice_processor().coding_agent.batcher if invoice_processor_ready() else None
+    return {
+        "calls": llm_limiter.stats(),
+        "coding_batches": batcher.stats() if batcher is not None else None,
+    }
+
+
+@router.get("/pipeline", response_class=PlainTextResponse)
+def get_pipeline_metrics(
+    current_user: User = Depends(require_role(["admin"]))
+):
+    """
+    Get pipeline and per-node latency and token histograms in the
+    Prometheus text format.
+    """
+    return PlainTextResponse(
+        pipeline_metrics.render(),
+        media_type="text/plain; version=0.0.4",
+    )
@@ -1,12 +1,15 @@
 """
 Supplier API endpoints.
 """
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.core.security import get_current_user, require_role
-from app.db.session import get_db
+from app.core.security import get_current_user_async, require_role
+from app.db.session import get_db, get_async_db
+from app.db.pagination import NEXT_CURSOR_HEADER, InvalidCursorError, keyset_page, response_columns
 from app.models.user import User
 from app.models.supplier import Supplier
 from app.schemas.supplier import SupplierCreate, SupplierUpdate, SupplierResponse
@@ -44,29 +47,41 @@ def create_supplier(
 
 
 @router.get("/", response_model=List[SupplierResponse])
-def list_suppliers(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def list_suppliers(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
-    List all suppliers.
+    List suppliers, newest first.
+
+    The cursor of the next page is returned in the X-Next-Cursor header.
     """
-    suppliers = db.query(Supplier).offset(skip).limit(limit).all()
+    statement = select(Supplier).options(response_columns(Supplier, SupplierResponse))
+
+    try:
+        suppliers, next_cursor = await db.run_sync(keyset_page, statement, Supplier, cursor, limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
     return suppliers
 
 
 @router.get("/{supplier_id}", response_model=SupplierResponse)
-def get_supplier(
+async def get_supplier(
     supplier_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
     Get supplier by ID.
     """
-    supplier = db.query(Supplier).filter(Supplier.id == supplier_id).first()
+    supplier = await db.get(Supplier, supplier_id, options=[response_columns(Supplier, SupplierResponse)])
 
     if not supplier:
         raise HTTPException(
@@ -18,9 +18,18 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your-secret-key-change-in-production-min-32-chars"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
+    USER_CACHE_TTL_SECONDS: float = 30.0  # How stale a user's role or status may be in other workers
+    USER_CACHE_MAX_ENTRIES: int = 10000
 
     # Database
     DATABASE_URL: str = "postgresql://perfo:perfo123@db:5432/perfodb"
+    ASYNC_DATABASE_URL: Optional[str] = None  # Derived from DATABASE_URL when unset
+    DB_POOL_SIZE: int = 5  # Persistent connections per engine and worker
+    DB_MAX_OVERFLOW: int = 10  # Extra connections opened under load
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced
+    DB_POOL_TIMEOUT: float = 30.0  # Seconds to wait for a free connection
+    SUPPLIER_CACHE_TTL_SECONDS: float = 300.0  # How long a tax ID resolves to a cached supplier
+    SUPPLIER_CACHE_MAX_ENTRIES: int = 50000
 
     # Azure OpenAI
     AZURE_OPENAI_ENDPOINT: str
@@ -29,11 +38,28 @@ class Settings(BaseSettings):
     AZURE_OPENAI_API_VERSION: str = "2024-12-01-preview"
     AZURE_OPENAI_MODEL: str = "gpt-4.1"
 
+    # LLM Client
+    LLM_MAX_CONCURRENCY: int = 16  # Model calls in flight per worker
+    LLM_MAX_CONNECTIONS: int = 32  # Pooled keep-alive connections to Azure OpenAI
+    LLM_KEEPALIVE_SECONDS: float = 60.0
+    LLM_TIMEOUT_SECONDS: float = 60.0  # Per model call
+    LLM_MAX_RETRIES: int = 4  # Retries on 429, 5xx, timeouts and connection errors
+    LLM_BACKOFF_BASE_SECONDS: float = 0.5  # Doubles per retry, with full jitter
+    LLM_BACKOFF_MAX_SECONDS: float = 20.0
+
     # Qdrant Vector Database
     QDRANT_URL: Optional[str] = None
     QDRANT_API_KEY: Optional[str] = None
     QDRANT_COLLECTION_NAME: str = "invoices"
 
+    # Document Text Extraction
+    OCR_VISION_ENABLED: bool = True  # Transcribe scanned pages and images with the chat model
+    OCR_MIN_PAGE_CHARS: int = 20  # Pages with less text layer than this are treated as scans
+    OCR_MAX_PAGES: int = 50  # Pages read per PDF
+    OCR_PAGE_CACHE_MAX_ENTRIES: int = 1000  # Page transcriptions kept in memory
+    OCR_PROMPT_TOKEN_BUDGET: int = 3000  # Tokens of invoice text sent for extraction, 0 for no limit
+    OCR_STREAMING_ENABLED: bool = True  # Stream extraction answers and stop early on unusable documents
+
     # LlamaParse
     LLAMAPARSE_API_KEY: Optional[str] = None
 
@@ -43,12 +69,54 @@ class Settings(BaseSettings):
     # File Upload
     UPLOAD_DIR: str = "/app/uploads"
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1MB per read/write when streaming to disk
+    MAX_BATCH_UPLOAD_SIZE: int = 500 * 1024 * 1024  # 500MB per batch, uploads and extracted ZIP contents together
+    MAX_BATCH_DOCUMENTS: int = 1000
+
+    # Background Processing
+    INVOICE_PROCESSING_ENABLED: bool = True  # False for read-only API workers
+    PRELOAD_PIPELINE: bool = False  # Build agents and graph at startup instead of first use
+    INVOICE_WORKERS: int = 4  # Concurrent invoice processing jobs per API worker
+    INVOICE_QUEUE_SIZE: int = 100  # Jobs allowed to wait before uploads get 503
+    JOB_HISTORY_SIZE: int = 1000  # Finished jobs kept for status polling
+    JOB_MAX_RETRIES: int = 3  # Times a job is run again when the LLM stays unavailable
+    JOB_RETRY_DELAY_SECONDS: float = 30.0  # Grows linearly with each attempt
+    BATCH_CONCURRENCY: int = 4  # Documents of one batch processed in parallel
+    STORE_BATCH_SIZE: int = 100  # Invoices persisted per transaction
+    AUDIT_STORED_INVOICES: bool = True  # Write an audit log entry for each invoice the pipeline stores
 
     # CORS
     BACKEND_CORS_ORIGINS: list = ["http://localhost:3000", "http://localhost:5173"]
 
     # Agents Configuration
     TOUCHLESS_THRESHOLD: float = 0.95  # 95% confidence for touchless processing
+    PIPELINE_VERSION: str = "2"  # Bump when agent logic changes to invalidate cached results
+    SPECULATIVE_CODING: bool = True  # Run coding concurrently with validation
+    SPECULATIVE_CODING_WORKERS: int = 8  # Threads running speculative codings per API worker
+    CODING_BATCH_ENABLED: bool = True  # Code concurrent invoices in one LLM call
+    CODING_BATCH_MAX_SIZE: int = 10  # Invoices per batched coding call
+    CODING_BATCH_WINDOW_SECONDS: float = 0.05  # How long a coding waits for others to join
+
+    # Processing Result Cache
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_ENTRIES: int = 10000
+
+    # Historical Coding Index
+    CODING_INDEX_ENABLED: bool = True
+    CODING_INDEX_MIN_CONFIDENCE: float = 0.9  # Share of past codings that must agree
+    CODING_INDEX_MIN_OCCURRENCES: int = 3  # Past invoices needed before skipping the LLM
+
+    # LLM Response Cache
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MEMORY_ENTRIES: int = 1024
+    LLM_CACHE_PATH: str = "/app/cache/llm_cache.sqlite3"  # Empty for memory only
+    LLM_CACHE_MAX_ENTRIES: int = 100000  # On-disk entries before LRU eviction
+    LLM_CACHE_TTL_SECONDS: int = 30 * 24 * 3600  # 30 days
+
+    # Duplicate Detection
+    DUPLICATE_FILTER_CAPACITY: int = 1_000_000  # Invoices the Bloom filter is sized for
+    DUPLICATE_FILTER_ERROR_RATE: float = 0.01
+    DUPLICATE_FILTER_REFRESH_SECONDS: float = 5.0  # Pull invoices stored by other workers
 
     class Config:
         env_file = ".env"
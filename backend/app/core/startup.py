@@ -0,0 +1,41 @@
+"""
+Startup time accounting.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict
+
+
+class StartupReport:
+    """Durations of the phases a worker goes through before serving requests."""
+
+    def __init__(self):
+        """Initialize an empty report."""
+        self._phases: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        """Record the duration of a phase."""
+        with self._lock:
+            self._phases[name] = seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block as a startup phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self) -> Dict[str, Any]:
+        """Return phase durations in milliseconds."""
+        with self._lock:
+            phases = {name: round(seconds * 1000, 1) for name, seconds in self._phases.items()}
+        return {"phases": phases, "total_ms": round(sum(phases.values()), 1)}
+
+
+# Global startup report
+startup_report = StartupReport()
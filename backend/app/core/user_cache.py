@@ -0,0 +1,102 @@
+"""
+In-process cache of authenticated users.
+
+Every authenticated request resolves its user from the token subject.
+Resolved users are kept for a short TTL so repeated requests skip the
+users table. Entries are dropped when a user row is updated or deleted in
+this process; other workers see the change once their entry expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event, inspect
+
+from app.core.config import settings
+from app.models.user import User
+
+USER_COLUMNS = tuple(column.key for column in User.__table__.columns)
+
+
+class UserCache:
+    """TTL-bounded LRU of user column values keyed by username."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        """
+        Args:
+            max_entries: Users kept before least recently used ones are evicted
+            ttl_seconds: Age after which a user is loaded from the database again
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, username: str) -> Optional[User]:
+        """Return a detached copy of the cached user, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(username)
+                self._counters["hits"] += 1
+                # A fresh instance per request, so callers never share state
+                return User(**entry[0])
+
+            if entry is not None:
+                del self._entries[username]
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, user: User) -> None:
+        """Cache the column values of a loaded user."""
+        values = {key: getattr(user, key) for key in USER_COLUMNS}
+
+        with self._lock:
+            self._entries[user.username] = (values, time.monotonic())
+            self._entries.move_to_end(user.username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *usernames: Optional[str]) -> None:
+        """Drop the given users from the cache."""
+        with self._lock:
+            for username in usernames:
+                if username is not None and self._entries.pop(username, None) is not None:
+                    self._counters["invalidations"] += 1
+
+    def clear(self) -> None:
+        """Drop every cached user."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+
+        lookups = counters["hits"] + counters["misses"]
+        counters.update({
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        })
+        return counters
+
+
+# Global cache instance
+user_cache = UserCache(
+    max_entries=settings.USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target: User) -> None:
+    """Forget a user whose row changed, under its old and new username."""
+    history = inspect(target).attrs.username.history
+    user_cache.invalidate(target.username, *(history.deleted or ()))
@@ -6,6 +6,7 @@ from app.core.security import get_password_hash
 from app.models.user import User
 from app.models.supplier import Supplier
 from app.models.invoice import Invoice
+from app.services.invoice_stats import rebuild_invoice_counters
 from datetime import datetime, timedelta
 
 
@@ -197,6 +198,9 @@ def init_db(db: Session) -> None:
 
     db.commit()
 
+    # Seed invoices bypass the write path that maintains the counters
+    rebuild_invoice_counters(db)
+
     print("✅ Database initialized with seed data")
     print("\n👤 Test Users:")
     print("   Admin:           username='admin'            password='admin123'")
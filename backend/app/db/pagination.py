@@ -0,0 +1,86 @@
+"""
+Keyset pagination helpers for list endpoints.
+
+Pages are ordered newest first by (created_at, id) and continue from an
+opaque cursor holding the sort key of the last row returned, so fetching a
+deep page costs the same index seek as fetching the first one.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy import Select, tuple_
+from sqlalchemy.orm import Session, load_only
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode the sort key of a row as an opaque cursor."""
+    payload = json.dumps([created_at.isoformat(), row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by `encode_cursor`."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("Invalid pagination cursor") from e
+
+
+def response_columns(model: Type[Any], schema: Type[BaseModel]):
+    """
+    Loader option restricting a query to the columns a response schema uses,
+    plus the pagination sort key.
+    """
+    fields = {"id", "created_at", *schema.model_fields}
+    return load_only(*(getattr(model, field) for field in sorted(fields) if hasattr(model, field)))
+
+
+def keyset_page(
+    db: Session,
+    statement: Select,
+    model: Type[Any],
+    cursor: Optional[str],
+    limit: int,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Fetch one page of `statement`, newest first.
+
+    Async endpoints run this through `AsyncSession.run_sync`.
+
+    Args:
+        db: Database session
+        statement: Select of `model`, with any filters applied
+        model: Mapped class with `created_at` and `id` columns
+        cursor: Cursor returned with the previous page, or None for the first page
+        limit: Maximum number of rows to return
+
+    Returns:
+        The rows of the page and the cursor of the next page, or None if this
+        is the last page
+    """
+    sort_key = tuple_(model.created_at, model.id)
+
+    if cursor:
+        statement = statement.where(sort_key < tuple_(*decode_cursor(cursor)))
+
+    # One extra row tells whether another page follows
+    statement = statement.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+    rows = db.execute(statement).scalars().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return rows, next_cursor
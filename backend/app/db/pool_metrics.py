@@ -0,0 +1,128 @@
+"""
+Connection pool instrumentation.
+
+Pool events count checkouts, new connections and invalidations, a pool
+subclass times how long checkouts wait for a free connection, and the
+engine's error hook counts failed pre-pings. Together with the live pool
+status this shows exhaustion before requests start timing out.
+"""
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolMetrics:
+    """Counters for one engine's connection pool in this worker."""
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: Label of the engine in reports
+        """
+        self.name = name
+        self.engine: Engine = None
+        self._lock = threading.Lock()
+        self._counters = {
+            "checkouts": 0,
+            "connects": 0,
+            "invalidations": 0,
+            "timeouts": 0,
+            "pre_ping_failures": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "checked_out_peak": 0,
+            "overflow_peak": 0,
+        }
+
+    def attach(self, engine: Engine) -> None:
+        """Register the event listeners on a (sync) engine and its pool."""
+        self.engine = engine
+        engine.pool.metrics = self
+
+        event.listen(engine.pool, "connect", lambda *args: self._increment("connects"))
+        event.listen(engine.pool, "invalidate", lambda *args: self._increment("invalidations"))
+        event.listen(engine.pool, "checkout", self._on_checkout)
+        event.listen(engine, "handle_error", self._on_error)
+
+    def record_wait(self, seconds: float) -> None:
+        """Record how long a checkout waited for a connection."""
+        with self._lock:
+            self._counters["wait_seconds_total"] += seconds
+            self._counters["wait_seconds_max"] = max(self._counters["wait_seconds_max"], seconds)
+
+    def record_timeout(self) -> None:
+        """Record a checkout that gave up after the pool timeout."""
+        self._increment("timeouts")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the counters together with the live pool status."""
+        with self._lock:
+            counters = dict(self._counters)
+
+        pool = self.engine.pool
+        checkouts = counters["checkouts"]
+        counters.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "wait_seconds_avg": round(counters["wait_seconds_total"] / checkouts, 6) if checkouts else 0.0,
+        })
+        return counters
+
+    def _increment(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        pool = self.engine.pool
+        with self._lock:
+            self._counters["checkouts"] += 1
+            self._counters["checked_out_peak"] = max(self._counters["checked_out_peak"], pool.checkedout())
+            self._counters["overflow_peak"] = max(self._counters["overflow_peak"], pool.overflow())
+
+    def _on_error(self, context) -> None:
+        if context.is_pre_ping:
+            self._increment("pre_ping_failures")
+
+
+class _TimedPoolMixin:
+    """Times checkouts and reports them to the pool's `metrics`."""
+
+    metrics: PoolMetrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_timeout()
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        # Invalidation replaces the pool; keep reporting to the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    """QueuePool that records checkout wait times."""
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records checkout wait times."""
+
+
+# Global metrics instances, one per engine
+sync_pool_metrics = PoolMetrics("sync")
+async_pool_metrics = PoolMetrics("async")
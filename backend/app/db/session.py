@@ -2,17 +2,60 @@
 Database session management.
 """
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.db.pool_metrics import (
+    TimedAsyncAdaptedQueuePool,
+    TimedQueuePool,
+    async_pool_metrics,
+    sync_pool_metrics,
+)
+
+# Pool sizing applies to each engine in each worker process
+POOL_OPTIONS = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_pre_ping": True,
+}
 
 # Create database engine
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+engine = create_engine(settings.DATABASE_URL, poolclass=TimedQueuePool, **POOL_OPTIONS)
+sync_pool_metrics.attach(engine)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers for the sync URLs the application is configured with
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(database_url: str) -> str:
+    """Derive the async driver URL for a sync database URL."""
+    url = make_url(database_url)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+    return url.render_as_string(hide_password=False)
+
+
+# Async engine for read endpoints that should not occupy the threadpool
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL),
+    poolclass=TimedAsyncAdaptedQueuePool,
+    **POOL_OPTIONS,
+)
+async_pool_metrics.attach(async_engine.sync_engine)
+
+# Objects stay readable after the session closes for response serialization
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Create base class for models
 Base = declarative_base()
 
@@ -24,3 +67,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Get async database session dependency."""
+    async with AsyncSessionLocal() as db:
+        yield db
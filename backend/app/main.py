@@ -2,14 +2,23 @@
 PERFO AI - Main FastAPI Application
 AI-Powered Accounts Payable Automation Platform
 """
+import time
+
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.api.v1 import auth, invoices, suppliers
-from app.db.session import engine, Base
+from app.core.startup import startup_report
+from app.api.v1 import auth, invoices, suppliers, metrics
+from app.agents.pipeline import get_invoice_processor
+from app.db.session import engine, Base, SessionLocal
+from app.services.invoice_stats import ensure_invoice_counters
+from app.services.jobs import job_manager
+from app.services.uploads import RequestSizeLimitMiddleware
+import app.models  # noqa: F401 - register every table before create_all
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+startup_report.record("imports", time.perf_counter() - _import_started)
 
 # Create FastAPI app
 app = FastAPI(
@@ -27,12 +36,50 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Location", "X-Next-Cursor"],
+)
+
+# Refuse oversized uploads before their body is read
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    limits={
+        f"{settings.API_V1_STR}/invoices/upload": settings.MAX_UPLOAD_SIZE,
+        f"{settings.API_V1_STR}/invoices/upload/batch": settings.MAX_BATCH_UPLOAD_SIZE,
+    },
 )
 
 # Include routers
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["Authentication"])
 app.include_router(invoices.router, prefix=f"{settings.API_V1_STR}/invoices", tags=["Invoices"])
 app.include_router(suppliers.router, prefix=f"{settings.API_V1_STR}/suppliers", tags=["Suppliers"])
+app.include_router(metrics.router, prefix=f"{settings.API_V1_STR}/metrics", tags=["Metrics"])
+
+
+@app.on_event("startup")
+def startup():
+    """Create database tables and counters, and optionally warm up the processing pipeline."""
+    with startup_report.phase("create_tables"):
+        Base.metadata.create_all(bind=engine)
+
+    with startup_report.phase("invoice_counters"):
+        db = SessionLocal()
+        try:
+            ensure_invoice_counters(db)
+        finally:
+            db.close()
+
+    # Otherwise the pipeline is built by the first invoice processing job
+    if settings.INVOICE_PROCESSING_ENABLED and settings.PRELOAD_PIPELINE:
+        get_invoice_processor()
+
+
+@app.on_event("shutdown")
+def shutdown_job_manager():
+    """Let running invoice jobs finish, then close LLM connections, before the worker exits."""
+    job_manager.shutdown(wait=True)
+
+    from app.agents.llm_client import close_http_client
+    close_http_client()
 
 
 @app.get("/")
@@ -51,6 +98,12 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/health/startup")
+def startup_breakdown():
+    """Time spent in each startup phase of this worker."""
+    return startup_report.summary()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
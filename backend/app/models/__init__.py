@@ -3,7 +3,14 @@ Database models.
 """
 from app.models.user import User
 from app.models.invoice import Invoice
+from app.models.invoice_extraction import InvoiceExtraction
 from app.models.supplier import Supplier
 from app.models.audit_log import AuditLog
+from app.models.processing_cache import ProcessingResultCache
+from app.models.coding_pattern import CodingPattern
+from app.models.invoice_counter import InvoiceCounter, InvoiceDailyCount
 
-__all__ = ["User", "Invoice", "Supplier", "AuditLog"]
+__all__ = [
+    "User", "Invoice", "InvoiceExtraction", "Supplier", "AuditLog", "ProcessingResultCache",
+    "CodingPattern", "InvoiceCounter", "InvoiceDailyCount",
+]
@@ -0,0 +1,30 @@
+"""
+Coding pattern model recording how past invoices were coded.
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from app.db.session import Base
+
+
+class CodingPattern(Base):
+    """GL account / cost center observed for a supplier and line-item signature."""
+
+    __tablename__ = "coding_patterns"
+    __table_args__ = (
+        UniqueConstraint(
+            "supplier_key", "item_signature", "gl_account", "cost_center",
+            name="uq_coding_patterns_key_coding"
+        ),
+        Index("ix_coding_patterns_supplier_signature", "supplier_key", "item_signature"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    supplier_key = Column(String, nullable=False)  # Normalized tax ID, or name if unknown
+    item_signature = Column(String, nullable=False)  # "*" for supplier-wide patterns
+    gl_account = Column(String, nullable=False)
+    cost_center = Column(String, nullable=False)
+    occurrences = Column(Integer, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<CodingPattern(supplier='{self.supplier_key}', gl='{self.gl_account}', cc='{self.cost_center}')>"
@@ -1,7 +1,7 @@
 """
 Invoice model for managing invoices.
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.session import Base
@@ -11,6 +11,16 @@ class Invoice(Base):
     """Invoice model."""
 
     __tablename__ = "invoices"
+    __table_args__ = (
+        # Duplicate detection: same supplier, number, amount and date
+        Index(
+            "ix_invoices_duplicate_lookup",
+            "supplier_id", "invoice_number", "total_amount", "invoice_date"
+        ),
+        # Keyset pagination, newest first, optionally filtered by status
+        Index("ix_invoices_created_at_id", "created_at", "id"),
+        Index("ix_invoices_status_created_at_id", "status", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     invoice_number = Column(String, unique=True, index=True, nullable=False)
@@ -35,8 +45,9 @@ class Invoice(Base):
     # AI Processing
     confidence_score = Column(Float, default=0.0)
     is_touchless = Column(Boolean, default=False)
-    extracted_data = Column(JSON, nullable=True)
     validation_errors = Column(JSON, nullable=True)
+    processing_time = Column(Float, nullable=True)  # Pipeline run time in seconds
+    stage_metrics = Column(JSON, nullable=True)  # Seconds and LLM tokens per pipeline node
 
     # Payment
     payment_terms = Column(String, nullable=True)
@@ -51,6 +62,7 @@ class Invoice(Base):
     # Document reference
     document_path = Column(String, nullable=True)
     document_format = Column(String, nullable=True)  # pdf, xml, etc.
+    document_hash = Column(String, nullable=True, index=True)  # SHA-256 of the document bytes
 
     # Approval workflow
     approval_status = Column(String, default="pending")  # pending, in_review, approved, rejected
@@ -68,6 +80,10 @@ class Invoice(Base):
     # Relationships
     supplier = relationship("Supplier", back_populates="invoices")
     approver = relationship("User", foreign_keys=[approved_by])
+    extraction = relationship(
+        "InvoiceExtraction", back_populates="invoice", uselist=False,
+        cascade="all, delete-orphan", passive_deletes=True
+    )
 
     def __repr__(self):
         return f"<Invoice(number='{self.invoice_number}', supplier_id={self.supplier_id}, status='{self.status}')>"
@@ -0,0 +1,30 @@
+"""
+Invoice counter models backing the statistics endpoints.
+"""
+from sqlalchemy import Column, Integer, String, Float, Date
+from app.db.session import Base
+
+
+class InvoiceCounter(Base):
+    """Running total over all invoices, e.g. invoices per status or payables."""
+
+    __tablename__ = "invoice_counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f"<InvoiceCounter(name='{self.name}', value={self.value})>"
+
+
+class InvoiceDailyCount(Base):
+    """Invoices received per day, for rolling-window dashboard figures."""
+
+    __tablename__ = "invoice_daily_counts"
+
+    day = Column(Date, primary_key=True)
+    incoming = Column(Integer, nullable=False, default=0)
+    touchless = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<InvoiceDailyCount(day={self.day}, incoming={self.incoming})>"
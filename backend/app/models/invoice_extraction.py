@@ -0,0 +1,24 @@
+"""
+Invoice extraction model holding the pipeline output of each invoice.
+"""
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, LargeBinary
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.db.session import Base
+
+
+class InvoiceExtraction(Base):
+    """Compressed extraction result of an invoice, kept out of the invoices row."""
+
+    __tablename__ = "invoice_extractions"
+
+    invoice_id = Column(Integer, ForeignKey("invoices.id", ondelete="CASCADE"), primary_key=True)
+    schema_version = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)  # zlib-compressed JSON
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    invoice = relationship("Invoice", back_populates="extraction")
+
+    def __repr__(self):
+        return f"<InvoiceExtraction(invoice_id={self.invoice_id}, version={self.schema_version}, bytes={len(self.data or b'')})>"
@@ -0,0 +1,26 @@
+"""
+Processing result cache model for reusing pipeline output of identical documents.
+"""
+from sqlalchemy import Column, Integer, String, DateTime, JSON, UniqueConstraint
+from sqlalchemy.sql import func
+from app.db.session import Base
+
+
+class ProcessingResultCache(Base):
+    """Final pipeline state keyed by document content hash and pipeline version."""
+
+    __tablename__ = "processing_result_cache"
+    __table_args__ = (
+        UniqueConstraint("document_hash", "pipeline_version", name="uq_processing_cache_hash_version"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_hash = Column(String, nullable=False)  # SHA-256 of the document bytes
+    pipeline_version = Column(String, nullable=False)
+    result = Column(JSON, nullable=False)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    def __repr__(self):
+        return f"<ProcessingResultCache(hash='{self.document_hash[:12]}', version='{self.pipeline_version}')>"
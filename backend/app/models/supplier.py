@@ -1,7 +1,7 @@
 """
 Supplier model for managing vendors.
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.session import Base
@@ -11,6 +11,10 @@ class Supplier(Base):
     """Supplier/Vendor model."""
 
     __tablename__ = "suppliers"
+    __table_args__ = (
+        # Keyset pagination, newest first
+        Index("ix_suppliers_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False, index=True)
@@ -2,7 +2,7 @@
 Invoice schemas.
 """
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
 from pydantic import BaseModel
 
 
@@ -48,6 +48,29 @@ class InvoiceResponse(InvoiceBase):
         from_attributes = True
 
 
+class InvoiceExtractionResponse(BaseModel):
+    """Stored pipeline extraction result of an invoice."""
+    invoice_id: int
+    schema_version: int
+    created_at: Optional[datetime] = None
+    data: Dict[str, Any]
+
+
+class InvoiceJobResponse(BaseModel):
+    """Background invoice processing job."""
+    job_id: str
+    job_type: str
+    filename: Optional[str] = None
+    status: str  # queued, running, retrying, completed, failed
+    attempts: int = 0
+    submitted_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    invoice_id: Optional[int] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
 class InvoiceStats(BaseModel):
     """Invoice statistics."""
     total_invoices: int
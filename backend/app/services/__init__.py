@@ -0,0 +1 @@
+"""Application services shared by API routes and background jobs."""
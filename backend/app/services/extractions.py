@@ -0,0 +1,64 @@
+"""
+Compact, versioned storage of pipeline extraction results.
+
+The full processing state of an invoice is only needed when someone looks
+at how it was extracted, so it is stored in `invoice_extractions` rather
+than on the invoice row: minified JSON, zlib-compressed, tagged with the
+schema version it was written with.
+"""
+import json
+import zlib
+from typing import Any, Dict
+
+from fastapi.encoders import jsonable_encoder
+
+from app.models.invoice_extraction import InvoiceExtraction
+
+# Bump when the stored layout changes, and upgrade older data in decode_extraction
+EXTRACTION_SCHEMA_VERSION = 1
+
+# State fields not stored: kept on the invoice row or only meaningful while processing
+EXCLUDED_FIELDS = frozenset({
+    "document_content", "document_path", "document_format", "document_hash",
+    "processing_time", "stage_metrics", "from_cache", "current_step",
+})
+
+
+class UnsupportedExtractionVersionError(ValueError):
+    """Raised for extraction data written by a newer schema version."""
+
+
+def encode_extraction(state: Dict[str, Any]) -> bytes:
+    """
+    Serialize a processing state for storage.
+
+    Returns:
+        zlib-compressed JSON of the state's extraction fields
+    """
+    data = {key: value for key, value in state.items() if key not in EXCLUDED_FIELDS}
+    payload = json.dumps(jsonable_encoder(data), separators=(",", ":"), ensure_ascii=False)
+    return zlib.compress(payload.encode("utf-8"))
+
+
+def decode_extraction(data: bytes, schema_version: int) -> Dict[str, Any]:
+    """
+    Load stored extraction data.
+
+    Dates are returned as ISO strings.
+
+    Raises:
+        UnsupportedExtractionVersionError: If the data is newer than this code
+    """
+    if schema_version > EXTRACTION_SCHEMA_VERSION:
+        raise UnsupportedExtractionVersionError(
+            f"Extraction schema version {schema_version} is newer than {EXTRACTION_SCHEMA_VERSION}"
+        )
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def build_extraction(state: Dict[str, Any]) -> InvoiceExtraction:
+    """Create the extraction record of a processing state, for the current schema version."""
+    return InvoiceExtraction(
+        schema_version=EXTRACTION_SCHEMA_VERSION,
+        data=encode_extraction(state),
+    )
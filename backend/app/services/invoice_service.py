@@ -0,0 +1,437 @@
+"""
+Invoice processing and persistence service.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple, Union
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.agents.pipeline import get_invoice_processor
+from app.agents.duplicate_detector import duplicate_detector
+from app.db.session import SessionLocal
+from app.models.audit_log import AuditLog
+from app.models.invoice import Invoice
+from app.models.supplier import Supplier
+from app.services.extractions import build_extraction
+from app.services.supplier_cache import supplier_cache
+from app.services.invoice_stats import invoice_snapshot, record_invoice_changes
+
+# Tax ID prefix of suppliers created for invoices without one
+TEMP_TAX_ID_PREFIX = "TEMP-"
+
+
+def _upsert_suppliers(db: Session, names_by_tax_id: Dict[str, str]) -> Dict[str, int]:
+    """
+    Insert missing suppliers and return the ID of every given tax ID.
+
+    On PostgreSQL the insert and the lookup of existing suppliers run as one
+    statement; concurrent uploads of a new supplier cannot conflict on the
+    tax ID constraint since conflicting inserts are skipped.
+
+    Args:
+        db: Database session
+        names_by_tax_id: Name to create each supplier with, by tax ID
+
+    Returns:
+        Supplier ID by tax ID
+    """
+    tax_ids = list(names_by_tax_id)
+    values = [
+        {"tax_id": tax_id, "name": name, "is_active": True, "is_verified": False}
+        for tax_id, name in names_by_tax_id.items()
+    ]
+
+    if db.get_bind().dialect.name == "postgresql":
+        inserted = (
+            postgresql_insert(Supplier.__table__)
+            .values(values)
+            .on_conflict_do_nothing(index_elements=["tax_id"])
+            .returning(Supplier.__table__.c.id, Supplier.__table__.c.tax_id)
+            .cte("inserted")
+        )
+        statement = select(inserted.c.id, inserted.c.tax_id).union_all(
+            select(Supplier.id, Supplier.tax_id).where(Supplier.tax_id.in_(tax_ids))
+        )
+    else:
+        statement = (
+            sqlite_insert(Supplier.__table__)
+            .values(values)
+            .on_conflict_do_nothing(index_elements=["tax_id"])
+            .returning(Supplier.__table__.c.id, Supplier.__table__.c.tax_id)
+        )
+
+    supplier_ids = {tax_id: supplier_id for supplier_id, tax_id in db.execute(statement)}
+
+    # Existing suppliers on SQLite, or ones committed by a concurrent upload
+    # after the statement started on PostgreSQL
+    missing = [tax_id for tax_id in tax_ids if tax_id not in supplier_ids]
+    if missing:
+        supplier_ids.update(
+            (tax_id, supplier_id)
+            for supplier_id, tax_id in db.execute(
+                select(Supplier.id, Supplier.tax_id).where(Supplier.tax_id.in_(missing))
+            )
+        )
+
+    return supplier_ids
+
+
+def _resolve_suppliers(db: Session, processing_results: List[Dict[str, Any]]) -> List[Tuple[int, str]]:
+    """
+    Find or create the suppliers of a set of processing results.
+
+    Suppliers are looked up in the supplier cache first; the rest are
+    upserted with a single statement. Results without a tax ID get a new
+    supplier under a temporary tax ID.
+
+    Returns:
+        The supplier ID and tax ID of each processing result, in order
+    """
+    tax_ids = []
+    names_by_tax_id = {}
+    for result in processing_results:
+        tax_id = result.get("supplier_tax_id") or f"{TEMP_TAX_ID_PREFIX}{uuid.uuid4().hex}"
+        tax_ids.append(tax_id)
+        names_by_tax_id.setdefault(tax_id, result.get("supplier_name") or "Unknown")
+
+    supplier_ids = supplier_cache.get_many(
+        tax_id for tax_id in names_by_tax_id if not tax_id.startswith(TEMP_TAX_ID_PREFIX)
+    )
+    missing = {
+        tax_id: name for tax_id, name in names_by_tax_id.items() if tax_id not in supplier_ids
+    }
+    if missing:
+        supplier_ids.update(_upsert_suppliers(db, missing))
+
+    return [(supplier_ids[tax_id], tax_id) for tax_id in tax_ids]
+
+
+def _build_invoice(
+    processing_result: Dict[str, Any],
+    supplier_id: int,
+    document_path: str,
+    document_format: str,
+    user_id: int,
+) -> Invoice:
+    """Create the invoice record for a processing result."""
+    requires_approval = processing_result.get("requires_approval")
+
+    return Invoice(
+        invoice_number=processing_result.get("invoice_number") or f"INV-{datetime.now().timestamp()}",
+        supplier_id=supplier_id,
+        invoice_date=processing_result.get("invoice_date") or datetime.now(),
+        due_date=processing_result.get("due_date") or datetime.now() + timedelta(days=30),
+        total_amount=processing_result.get("total_amount") or 0,
+        tax_amount=processing_result.get("tax_amount") or 0,
+        net_amount=processing_result.get("net_amount") or 0,
+        currency=processing_result.get("currency") or "USD",
+        po_number=processing_result.get("po_number"),
+        po_matched=processing_result.get("po_matched", False),
+        status="pending" if requires_approval else "approved",
+        processing_status=processing_result.get("processing_status", "completed"),
+        confidence_score=processing_result.get("confidence_score", 0.0),
+        is_touchless=processing_result.get("is_touchless", False),
+        validation_errors=processing_result.get("validation_errors"),
+        processing_time=processing_result.get("processing_time"),
+        stage_metrics=processing_result.get("stage_metrics"),
+        gl_account=processing_result.get("gl_account"),
+        cost_center=processing_result.get("cost_center"),
+        document_path=document_path,
+        document_format=document_format,
+        document_hash=processing_result.get("document_hash"),
+        approval_status="pending" if requires_approval else "approved",
+        approved_by=None if requires_approval else user_id,
+        approved_at=None if requires_approval else datetime.now(),
+        extraction=build_extraction(processing_result),
+    )
+
+
+def _audit_entry(invoice: Invoice, user_id: int) -> AuditLog:
+    """Create the audit record of an invoice stored by the pipeline."""
+    return AuditLog(
+        user_id=user_id,
+        action="create",
+        entity_type="invoice",
+        entity_id=invoice.id,
+        description=f"Invoice {invoice.invoice_number} created by AI processing",
+        changes={
+            "status": invoice.status,
+            "processing_status": invoice.processing_status,
+            "confidence_score": invoice.confidence_score,
+            "document_hash": invoice.document_hash,
+        },
+    )
+
+
+def _add_invoices(db: Session, items: List[Dict[str, Any]], user_id: int) -> List[Dict[str, Any]]:
+    """
+    Write suppliers, invoices with their extractions, counters and audit
+    records for `items` within the session's transaction.
+
+    Invoices are flushed with one batched INSERT ... RETURNING; the audit
+    records, which need the invoice IDs, are written when the transaction
+    commits.
+    """
+    suppliers = _resolve_suppliers(db, [item["result"] for item in items])
+
+    added = []
+    for item, (supplier_id, tax_id) in zip(items, suppliers):
+        invoice = _build_invoice(
+            item["result"], supplier_id, item["document_path"], item["document_format"], user_id
+        )
+        db.add(invoice)
+        added.append((invoice, item["result"], tax_id))
+
+    record_invoice_changes(db, [(None, invoice_snapshot(invoice)) for invoice, _, _ in added])
+    db.flush()
+
+    if settings.AUDIT_STORED_INVOICES:
+        db.add_all([_audit_entry(invoice, user_id) for invoice, _, _ in added])
+
+    # Captured before commit, which expires the loaded attributes
+    return [
+        {
+            "invoice_id": invoice.id,
+            "invoice_number": invoice.invoice_number,
+            "status": invoice.status,
+            "processing_status": invoice.processing_status,
+            "document_hash": invoice.document_hash,
+            "supplier_id": invoice.supplier_id,
+            "supplier_tax_id": tax_id,
+            "supplier_name": result.get("supplier_name") or "Unknown",
+        }
+        for invoice, result, tax_id in added
+    ]
+
+
+def _store_chunk(
+    db: Session,
+    items: List[Dict[str, Any]],
+    user_id: int,
+) -> List[Union[Dict[str, Any], Exception]]:
+    """
+    Persist `items` in one transaction.
+
+    If that fails on a constraint, the items are retried one by one in
+    savepoints so a single conflicting invoice does not discard the rest.
+    """
+    try:
+        outcomes = _add_invoices(db, items, user_id)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        outcomes = []
+        for item in items:
+            try:
+                with db.begin_nested():
+                    outcomes.extend(_add_invoices(db, [item], user_id))
+            except IntegrityError as e:
+                outcomes.append(e)
+        db.commit()
+
+    # Only now that they are committed may new suppliers be cached
+    supplier_cache.put_many({
+        outcome["supplier_tax_id"]: outcome["supplier_id"]
+        for outcome in outcomes
+        if not isinstance(outcome, Exception) and not outcome["supplier_tax_id"].startswith(TEMP_TAX_ID_PREFIX)
+    })
+
+    for outcome in outcomes:
+        if not isinstance(outcome, Exception):
+            duplicate_detector.register(
+                document_hash=outcome["document_hash"],
+                supplier_tax_id=outcome["supplier_tax_id"],
+                supplier_name=outcome["supplier_name"],
+                invoice_number=outcome["invoice_number"],
+            )
+
+    return outcomes
+
+
+def store_processing_results(
+    db: Session,
+    items: List[Dict[str, Any]],
+    user_id: int,
+) -> List[Union[Dict[str, Any], Exception]]:
+    """
+    Persist the suppliers and invoices produced by the processing pipeline.
+
+    Items are stored STORE_BATCH_SIZE per transaction. Each transaction
+    upserts the suppliers, inserts the invoices with their extractions,
+    updates the statistics counters and, if AUDIT_STORED_INVOICES is set,
+    records an audit entry per invoice.
+
+    Args:
+        db: Database session
+        items: Dicts with the processing `result`, `document_path` and
+            `document_format`
+        user_id: User who uploaded the documents
+
+    Returns:
+        For each item, a summary of the stored invoice or the error
+    """
+    outcomes = []
+    for start in range(0, len(items), settings.STORE_BATCH_SIZE):
+        outcomes.extend(_store_chunk(db, items[start:start + settings.STORE_BATCH_SIZE], user_id))
+    return outcomes
+
+
+def _job_result(outcome: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a stored invoice summary to what job clients need."""
+    return {
+        "invoice_id": outcome["invoice_id"],
+        "invoice_number": outcome["invoice_number"],
+        "status": outcome["status"],
+        "processing_status": outcome["processing_status"],
+    }
+
+
+def process_uploaded_invoice(
+    document_path: str,
+    document_format: str,
+    user_id: int,
+    document_hash: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Run the AI pipeline on an uploaded document and store the result.
+
+    Runs on a background worker thread with its own database session.
+
+    Returns:
+        Job result with the created invoice ID and status
+    """
+    processing_result = get_invoice_processor().process_invoice(
+        document_path=document_path,
+        document_format=document_format,
+        document_hash=document_hash
+    )
+
+    # Duplicates are reported against the existing invoice, not stored again
+    duplicate_of = processing_result.get("duplicate_of")
+    if duplicate_of is not None:
+        return {
+            "invoice_id": duplicate_of,
+            "duplicate": True,
+            "validation_errors": processing_result.get("validation_errors"),
+        }
+
+    db = SessionLocal()
+    try:
+        outcome = store_processing_results(db, [{
+            "result": processing_result,
+            "document_path": document_path,
+            "document_format": document_format,
+        }], user_id)[0]
+    finally:
+        db.close()
+
+    if isinstance(outcome, Exception):
+        raise outcome
+
+    return _job_result(outcome)
+
+
+def process_uploaded_batch(documents: List[Dict[str, Any]], user_id: int) -> Dict[str, Any]:
+    """
+    Run the AI pipeline on a batch of documents and store the results.
+
+    Documents are processed concurrently on a pool limited to
+    BATCH_CONCURRENCY, then all resulting invoices are stored together.
+
+    Args:
+        documents: Dicts with `filename`, `document_path`, `document_format`
+            and `document_hash`
+        user_id: User who uploaded the batch
+
+    Returns:
+        Job result with a per-document manifest
+    """
+    invoice_processor = get_invoice_processor()
+    manifest = [{"filename": document["filename"], "outcome": "pending"} for document in documents]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(documents)
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(settings.BATCH_CONCURRENCY, len(documents))),
+        thread_name_prefix="invoice-batch",
+    ) as pool:
+        futures = {
+            pool.submit(
+                invoice_processor.process_invoice,
+                document_path=document["document_path"],
+                document_format=document["document_format"],
+                document_hash=document["document_hash"],
+            ): index
+            for index, document in enumerate(documents)
+        }
+
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                manifest[index].update(outcome="failed", error=str(e))
+
+    # Skip duplicates of stored invoices and of earlier documents in the batch
+    to_store = []
+    first_by_number: Dict[str, int] = {}
+    copies: Dict[int, int] = {}
+    for index, result in enumerate(results):
+        if result is None:
+            continue
+
+        if result.get("duplicate_of") is not None:
+            manifest[index].update(
+                outcome="duplicate",
+                invoice_id=result["duplicate_of"],
+                validation_errors=result.get("validation_errors"),
+            )
+            continue
+
+        invoice_number = result.get("invoice_number")
+        if invoice_number and invoice_number in first_by_number:
+            manifest[index]["outcome"] = "duplicate"
+            copies[index] = first_by_number[invoice_number]
+            continue
+        if invoice_number:
+            first_by_number[invoice_number] = index
+
+        to_store.append(index)
+
+    if to_store:
+        db = SessionLocal()
+        try:
+            outcomes = store_processing_results(db, [
+                {
+                    "result": results[index],
+                    "document_path": documents[index]["document_path"],
+                    "document_format": documents[index]["document_format"],
+                }
+                for index in to_store
+            ], user_id)
+        finally:
+            db.close()
+
+        for index, outcome in zip(to_store, outcomes):
+            if isinstance(outcome, Exception):
+                manifest[index].update(outcome="failed", error=str(outcome.orig))
+            else:
+                manifest[index].update(_job_result(outcome), outcome="created")
+
+    # Point in-batch duplicates at the invoice created for the first copy
+    for index, first in copies.items():
+        manifest[index]["invoice_id"] = manifest[first].get("invoice_id")
+
+    return {
+        "total": len(documents),
+        "created": sum(entry["outcome"] == "created" for entry in manifest),
+        "duplicates": sum(entry["outcome"] == "duplicate" for entry in manifest),
+        "failed": sum(entry["outcome"] == "failed" for entry in manifest),
+        "documents": manifest,
+    }
@@ -0,0 +1,254 @@
+"""
+Invoice statistics backed by incrementally maintained counters.
+
+Every invoice write adjusts a handful of counter rows in the same
+transaction, so the statistics endpoints read a fixed number of rows no
+matter how many invoices exist. When the counters have not been built yet
+the figures are computed with a single conditional-aggregation query.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.invoice import Invoice
+from app.models.invoice_counter import InvoiceCounter, InvoiceDailyCount
+
+TRACKED_STATUSES = ("pending", "approved", "rejected")
+
+COUNTER_NAMES = (
+    "total",
+    *(f"status:{status}" for status in TRACKED_STATUSES),
+    "touchless",
+    "pending_clarification",
+    "processing_time_sum",
+    "processing_time_count",
+)
+
+Snapshot = Dict[str, Any]
+
+
+def _utc_day(created_at: Optional[datetime]) -> date:
+    """UTC day an invoice was created, the day its daily counts belong to."""
+    if created_at is None:
+        # Not flushed yet; the server default is about to stamp it now
+        return datetime.now(timezone.utc).date()
+    if created_at.tzinfo is None:
+        # SQLite returns CURRENT_TIMESTAMP, which is UTC, without a zone
+        return created_at.date()
+    return created_at.astimezone(timezone.utc).date()
+
+
+def _utc_day_column(db: Session):
+    """SQL expression of `_utc_day` over Invoice.created_at."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date(func.timezone("UTC", Invoice.created_at))
+    return func.date(Invoice.created_at)
+
+
+def invoice_snapshot(invoice: Invoice) -> Snapshot:
+    """Capture the invoice fields that contribute to the counters."""
+    return {
+        "status": invoice.status,
+        "processing_status": invoice.processing_status,
+        "is_touchless": bool(invoice.is_touchless),
+        "processing_time": invoice.processing_time,
+        "day": _utc_day(invoice.created_at),
+    }
+
+
+def _contribution(snapshot: Optional[Snapshot]) -> Dict[str, float]:
+    """Counter values contributed by a single invoice."""
+    if snapshot is None:
+        return {}
+
+    values = {"total": 1}
+    if snapshot["status"] in TRACKED_STATUSES:
+        values[f"status:{snapshot['status']}"] = 1
+    if snapshot["is_touchless"]:
+        values["touchless"] = 1
+    if snapshot["processing_status"] == "pending_clarification":
+        values["pending_clarification"] = 1
+    if snapshot["processing_time"] is not None:
+        values["processing_time_sum"] = snapshot["processing_time"]
+        values["processing_time_count"] = 1
+
+    return values
+
+
+def record_invoice_changes(
+    db: Session,
+    changes: Iterable[Tuple[Optional[Snapshot], Optional[Snapshot]]],
+) -> None:
+    """
+    Apply invoice writes to the counters within the caller's transaction.
+
+    Args:
+        db: Database session
+        changes: (before, after) snapshots of each written invoice; `before`
+            is None for new invoices and `after` is None for deleted ones
+    """
+    totals: Dict[str, float] = defaultdict(float)
+    daily: Dict[date, Dict[str, int]] = defaultdict(lambda: {"incoming": 0, "touchless": 0})
+
+    for before, after in changes:
+        for name, value in _contribution(after).items():
+            totals[name] += value
+        for name, value in _contribution(before).items():
+            totals[name] -= value
+
+        for snapshot, sign in ((after, 1), (before, -1)):
+            if snapshot is not None:
+                daily[snapshot["day"]]["incoming"] += sign
+                daily[snapshot["day"]]["touchless"] += sign * int(snapshot["is_touchless"])
+
+    # Counter rows only exist once built; until then reads aggregate directly.
+    # Rows are always locked in the same order so concurrent writes cannot deadlock.
+    for name in sorted(totals):
+        delta = totals[name]
+        if delta:
+            db.execute(
+                update(InvoiceCounter)
+                .where(InvoiceCounter.name == name)
+                .values(value=InvoiceCounter.value + delta)
+            )
+
+    for day in sorted(daily):
+        deltas = daily[day]
+        if any(deltas.values()):
+            _add_daily_counts(db, day, deltas)
+
+
+def _add_daily_counts(db: Session, day: date, deltas: Dict[str, int]) -> None:
+    """Add to a day's counts, creating the row for the first invoice of the day."""
+    statement = (
+        update(InvoiceDailyCount)
+        .where(InvoiceDailyCount.day == day)
+        .values(
+            incoming=InvoiceDailyCount.incoming + deltas["incoming"],
+            touchless=InvoiceDailyCount.touchless + deltas["touchless"],
+        )
+    )
+    if db.execute(statement).rowcount:
+        return
+
+    try:
+        with db.begin_nested():
+            db.add(InvoiceDailyCount(day=day, **deltas))
+    except IntegrityError:
+        # Another transaction created the row first
+        db.execute(statement)
+
+
+def aggregate_invoice_stats(db: Session, since: date) -> Dict[str, float]:
+    """
+    Compute every counter, plus the invoices received since `since`, from
+    the invoices table in a single pass.
+    """
+    def count_if(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    recent = Invoice.created_at >= datetime.combine(since, datetime.min.time())
+    columns = {
+        "total": func.count(Invoice.id),
+        **{
+            f"status:{status}": count_if(Invoice.status == status)
+            for status in TRACKED_STATUSES
+        },
+        "touchless": count_if(Invoice.is_touchless == True),
+        "pending_clarification": count_if(Invoice.processing_status == "pending_clarification"),
+        "processing_time_sum": func.coalesce(func.sum(Invoice.processing_time), 0),
+        "processing_time_count": func.count(Invoice.processing_time),
+        "incoming_since": count_if(recent),
+        "touchless_since": count_if(and_(recent, Invoice.is_touchless == True)),
+    }
+
+    row = db.execute(select(*(column.label(name) for name, column in columns.items()))).one()
+    return {name: float(value) for name, value in row._mapping.items()}
+
+
+def invoice_stats(db: Session, since: date) -> Dict[str, float]:
+    """
+    Read the counters and the invoices received since `since`.
+
+    Falls back to `aggregate_invoice_stats` while the counters are not built.
+    """
+    counters = dict(db.execute(select(InvoiceCounter.name, InvoiceCounter.value)).all())
+    if not counters:
+        return aggregate_invoice_stats(db, since)
+
+    incoming, touchless = db.execute(
+        select(
+            func.coalesce(func.sum(InvoiceDailyCount.incoming), 0),
+            func.coalesce(func.sum(InvoiceDailyCount.touchless), 0),
+        ).where(InvoiceDailyCount.day >= since)
+    ).one()
+
+    stats = {name: float(counters.get(name, 0.0)) for name in COUNTER_NAMES}
+    stats["incoming_since"] = float(incoming)
+    stats["touchless_since"] = float(touchless)
+    return stats
+
+
+def rebuild_invoice_counters(db: Session) -> None:
+    """
+    Recompute all counters from the invoices table and commit them.
+
+    Missing counter rows are created and committed first, so every write
+    from then on adjusts them. The recount then locks them before reading
+    the invoices: writes committed earlier are part of the recount, and
+    writes still running apply their deltas on top of it once it commits.
+    """
+    existing = set(db.scalars(select(InvoiceCounter.name)))
+    missing = [name for name in COUNTER_NAMES if name not in existing]
+    if missing:
+        db.add_all(InvoiceCounter(name=name, value=0.0) for name in missing)
+        db.commit()
+
+    # Same lock order as record_invoice_changes. Writers touching the daily
+    # counts always hold a counter row, so the daily rows are covered too;
+    # on SQLite the delete takes the database write lock before the reads.
+    db.execute(select(InvoiceCounter.name).order_by(InvoiceCounter.name).with_for_update()).all()
+    db.execute(delete(InvoiceDailyCount))
+
+    stats = aggregate_invoice_stats(db, date.min)
+    for name in COUNTER_NAMES:
+        db.execute(
+            update(InvoiceCounter)
+            .where(InvoiceCounter.name == name)
+            .values(value=stats[name])
+        )
+
+    day = _utc_day_column(db)
+    rows = db.execute(
+        select(
+            day,
+            func.count(Invoice.id),
+            func.sum(case((Invoice.is_touchless == True, 1), else_=0)),
+        ).where(Invoice.created_at.isnot(None)).group_by(day)
+    ).all()
+    db.add_all(
+        InvoiceDailyCount(
+            day=value if isinstance(value, date) else date.fromisoformat(value),
+            incoming=incoming,
+            touchless=touchless,
+        )
+        for value, incoming, touchless in rows
+    )
+
+    db.commit()
+
+
+def ensure_invoice_counters(db: Session) -> None:
+    """Build the counters if they do not exist yet."""
+    if db.query(InvoiceCounter.name).first() is not None:
+        return
+
+    try:
+        rebuild_invoice_counters(db)
+    except IntegrityError:
+        # Another worker is building them concurrently
+        db.rollback()
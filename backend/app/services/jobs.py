@@ -0,0 +1,240 @@
+"""
+In-process background job execution.
+
+Invoice processing involves several blocking LLM round-trips, so it must not
+run on the event loop. Jobs are executed on a bounded thread pool and their
+status is kept in memory so clients can poll for the outcome.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+
+class JobQueueFullError(Exception):
+    """Raised when no more jobs can be accepted."""
+
+
+class RetryLaterError(Exception):
+    """Raised by a job that failed transiently and should be run again later."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        """
+        Args:
+            message: What failed
+            retry_after: Seconds to wait before running the job again, if known
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Job:
+    """A unit of background work and its outcome."""
+
+    def __init__(self, job_type: str, filename: Optional[str] = None):
+        self.job_id = uuid.uuid4().hex
+        self.job_type = job_type
+        self.filename = filename
+        self.status = "queued"  # queued, running, retrying, completed, failed
+        self.attempts = 0
+        self.submitted_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.invoice_id: Optional[int] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a serializable snapshot of the job."""
+        return {
+            "job_id": self.job_id,
+            "job_type": self.job_type,
+            "filename": self.filename,
+            "status": self.status,
+            "attempts": self.attempts,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "invoice_id": self.invoice_id,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Bounded in-process worker pool with job status tracking.
+
+    At most `max_workers` jobs run concurrently and at most `max_pending`
+    more may wait in the queue; beyond that, submissions are rejected so a
+    burst of uploads cannot grow memory without bound.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_pending: int,
+        history_size: int,
+        max_retries: int = 0,
+        retry_delay: float = 0.0,
+    ):
+        """
+        Initialize job manager.
+
+        Args:
+            max_workers: Jobs run concurrently
+            max_pending: Jobs allowed to wait for a worker
+            history_size: Finished jobs kept for status polling
+            max_retries: Times a job raising RetryLaterError is run again
+            retry_delay: Seconds before a retry, unless the error says otherwise
+        """
+        self.max_workers = max_workers
+        self.history_size = history_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Create the thread pool on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="invoice-job",
+                )
+            return self._executor
+
+    def submit(
+        self,
+        job_type: str,
+        func: Callable[..., Dict[str, Any]],
+        *args: Any,
+        filename: Optional[str] = None,
+    ) -> Job:
+        """
+        Queue a job for background execution.
+
+        Args:
+            job_type: Kind of job (e.g. "invoice")
+            func: Callable returning a result dict; an "invoice_id" key is
+                surfaced on the job itself
+            *args: Positional arguments for `func`
+            filename: Original document name, for display
+
+        Returns:
+            The queued job
+
+        Raises:
+            JobQueueFullError: If the pool and its queue are saturated
+        """
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFullError("Invoice processing queue is full")
+
+        job = Job(job_type, filename=filename)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._trim_history()
+
+        try:
+            self._get_executor().submit(self._run, job, func, args)
+        except RuntimeError:
+            # Executor is shutting down
+            self._slots.release()
+            raise JobQueueFullError("Invoice processing is shutting down")
+
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Get a job by ID."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting jobs and release worker threads."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _run(self, job: Job, func: Callable[..., Dict[str, Any]], args: tuple) -> None:
+        """Execute a job and record its outcome."""
+        job.status = "running"
+        job.attempts += 1
+        job.started_at = job.started_at or datetime.utcnow()
+        try:
+            result = func(*args) or {}
+            job.result = result
+            job.invoice_id = result.get("invoice_id")
+            job.error = None
+            job.status = "completed"
+        except RetryLaterError as e:
+            job.error = str(e)
+            if job.attempts <= self.max_retries and self._schedule_retry(job, func, args, e.retry_after):
+                # The job keeps its slot until it finishes for good
+                return
+            job.status = "failed"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+
+        job.finished_at = datetime.utcnow()
+        self._slots.release()
+
+    def _schedule_retry(
+        self,
+        job: Job,
+        func: Callable[..., Dict[str, Any]],
+        args: tuple,
+        retry_after: Optional[float],
+    ) -> bool:
+        """Run the job again after a delay; False if the manager is shutting down."""
+        with self._lock:
+            if self._executor is None:
+                return False
+
+        def resubmit() -> None:
+            with self._lock:
+                executor = self._executor
+            try:
+                if executor is None:
+                    raise RuntimeError("shut down")
+                executor.submit(self._run, job, func, args)
+            except RuntimeError:
+                job.status = "failed"
+                job.finished_at = datetime.utcnow()
+                self._slots.release()
+
+        job.status = "retrying"
+        timer = threading.Timer(max(retry_after or 0.0, self.retry_delay * job.attempts), resubmit)
+        timer.daemon = True
+        timer.start()
+        return True
+
+    def _trim_history(self) -> None:
+        """Forget the oldest finished jobs beyond the history size."""
+        excess = len(self._jobs) - self.history_size
+        if excess <= 0:
+            return
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].status in ("completed", "failed"):
+                del self._jobs[job_id]
+                excess -= 1
+
+
+# Global job manager instance
+job_manager = JobManager(
+    max_workers=settings.INVOICE_WORKERS,
+    max_pending=settings.INVOICE_QUEUE_SIZE,
+    history_size=settings.JOB_HISTORY_SIZE,
+    max_retries=settings.JOB_MAX_RETRIES,
+    retry_delay=settings.JOB_RETRY_DELAY_SECONDS,
+)
@@ -0,0 +1,108 @@
+"""
+In-process cache of supplier IDs by tax ID.
+
+Most uploads come from suppliers seen before, so resolving the supplier of
+an invoice rarely needs the suppliers table. Only committed suppliers are
+cached. Entries are dropped when a supplier row is inserted, updated or
+deleted through the ORM in this process; other workers see the change
+once their entry expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event, inspect
+
+from app.core.config import settings
+from app.models.supplier import Supplier
+
+
+class SupplierCache:
+    """TTL-bounded LRU of supplier IDs keyed by tax ID."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        """
+        Args:
+            max_entries: Suppliers kept before least recently used ones are evicted
+            ttl_seconds: Age after which a supplier is resolved from the database again
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get_many(self, tax_ids: Iterable[str]) -> Dict[str, int]:
+        """Return the cached supplier ID of each known tax ID."""
+        found = {}
+        now = time.monotonic()
+
+        with self._lock:
+            for tax_id in tax_ids:
+                entry = self._entries.get(tax_id)
+                if entry is not None and now - entry[1] <= self.ttl_seconds:
+                    self._entries.move_to_end(tax_id)
+                    self._counters["hits"] += 1
+                    found[tax_id] = entry[0]
+                    continue
+
+                if entry is not None:
+                    del self._entries[tax_id]
+                self._counters["misses"] += 1
+
+        return found
+
+    def put_many(self, supplier_ids: Dict[str, int]) -> None:
+        """Cache committed supplier IDs by tax ID."""
+        now = time.monotonic()
+
+        with self._lock:
+            for tax_id, supplier_id in supplier_ids.items():
+                self._entries[tax_id] = (supplier_id, now)
+                self._entries.move_to_end(tax_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *tax_ids: Optional[str]) -> None:
+        """Drop the given tax IDs from the cache."""
+        with self._lock:
+            for tax_id in tax_ids:
+                if tax_id is not None and self._entries.pop(tax_id, None) is not None:
+                    self._counters["invalidations"] += 1
+
+    def clear(self) -> None:
+        """Drop every cached supplier."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+
+        lookups = counters["hits"] + counters["misses"]
+        counters.update({
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        })
+        return counters
+
+
+# Global cache instance
+supplier_cache = SupplierCache(
+    max_entries=settings.SUPPLIER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SUPPLIER_CACHE_TTL_SECONDS,
+)
+
+
+@event.listens_for(Supplier, "after_insert")
+@event.listens_for(Supplier, "after_update")
+@event.listens_for(Supplier, "after_delete")
+def _invalidate_supplier(mapper, connection, target: Supplier) -> None:
+    """Forget a supplier whose row changed, under its old and new tax ID."""
+    history = inspect(target).attrs.tax_id.history
+    supplier_cache.invalidate(target.tax_id, *(history.deleted or ()))
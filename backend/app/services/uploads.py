@@ -0,0 +1,178 @@
+"""
+Streaming storage of uploaded documents.
+"""
+import hashlib
+import os
+import zipfile
+from typing import Any, Dict, List, Tuple
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Allowance for multipart boundaries and part headers around the file body
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured size limit."""
+
+
+async def save_upload(
+    file: UploadFile,
+    destination: str,
+    max_size: int,
+    chunk_size: int,
+) -> Tuple[int, str]:
+    """
+    Stream an uploaded file to disk in fixed-size chunks.
+
+    The SHA-256 digest is computed in the same pass, and the copy stops as
+    soon as the limit is exceeded, so memory use stays at one chunk
+    regardless of document size. The file is written under a temporary name
+    and only renamed into place once complete.
+
+    Args:
+        file: Uploaded file
+        destination: Final path of the stored document
+        max_size: Maximum allowed size in bytes
+        chunk_size: Bytes read and written per chunk
+
+    Returns:
+        Tuple of (size in bytes, SHA-256 hex digest)
+
+    Raises:
+        UploadTooLargeError: If the file is larger than `max_size`
+    """
+    digest = hashlib.sha256()
+    size = 0
+    partial_path = f"{destination}.part"
+
+    try:
+        with open(partial_path, "wb") as f:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(
+                        f"File exceeds maximum upload size of {max_size} bytes"
+                    )
+
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+
+        os.replace(partial_path, destination)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    return size, digest.hexdigest()
+
+
+def extract_zip(
+    archive_path: str,
+    destination_dir: str,
+    allowed_extensions: List[str],
+    max_files: int,
+    max_total_size: int,
+    chunk_size: int,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Extract the documents of a ZIP archive, hashing each one while writing it.
+
+    Directory structure is flattened and members with other extensions are
+    skipped. Sizes are checked against the actual decompressed bytes, not
+    the sizes declared in the archive.
+
+    Args:
+        archive_path: Path of the uploaded archive
+        destination_dir: Directory the documents are written to
+        allowed_extensions: Document extensions to extract
+        max_files: Maximum number of documents in the archive
+        max_total_size: Maximum decompressed size of all documents, e.g. what
+            is left of the batch budget
+        chunk_size: Bytes read and written per chunk
+
+    Returns:
+        Dicts with `filename`, `document_path`, `document_format` and
+        `document_hash` for each extracted document, and the number of bytes
+        written
+
+    Raises:
+        UploadTooLargeError: If the archive holds too many or too large documents
+        zipfile.BadZipFile: If the file is not a valid ZIP archive
+    """
+    documents = []
+    total_size = 0
+    archive_name = os.path.splitext(os.path.basename(archive_path))[0]
+
+    with zipfile.ZipFile(archive_path) as archive:
+        for member in archive.infolist():
+            filename = os.path.basename(member.filename)
+            file_ext = os.path.splitext(filename)[1].lower()
+            if member.is_dir() or not filename or file_ext not in allowed_extensions:
+                continue
+
+            if len(documents) >= max_files:
+                raise UploadTooLargeError(f"Archive contains more than {max_files} documents")
+
+            document_path = os.path.join(destination_dir, f"{archive_name}_{len(documents)}_{filename}")
+            digest = hashlib.sha256()
+
+            with archive.open(member) as source, open(document_path, "wb") as target:
+                for chunk in iter(lambda: source.read(chunk_size), b""):
+                    total_size += len(chunk)
+                    if total_size > max_total_size:
+                        raise UploadTooLargeError(
+                            f"Archive contents exceed the remaining batch size of {max_total_size} bytes"
+                        )
+                    digest.update(chunk)
+                    target.write(chunk)
+
+            documents.append({
+                "filename": filename,
+                "document_path": document_path,
+                "document_format": file_ext[1:],
+                "document_hash": digest.hexdigest(),
+            })
+
+    return documents, total_size
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Reject oversized upload requests before their body is read.
+
+    Starlette parses multipart bodies before the endpoint runs, so a
+    declared Content-Length over the limit is refused up front with 413.
+    Requests without a Content-Length are still bounded by `save_upload`.
+    """
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, int]):
+        """
+        Args:
+            app: Wrapped ASGI application
+            limits: Maximum file size in bytes by request path
+        """
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] in self.limits:
+            limit = self.limits[scope["path"]]
+            content_length = dict(scope["headers"]).get(b"content-length")
+
+            if content_length and content_length.isdigit() and int(content_length) > limit + MULTIPART_OVERHEAD:
+                response = JSONResponse(
+                    {"detail": f"File exceeds maximum upload size of {limit} bytes"},
+                    status_code=413,
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
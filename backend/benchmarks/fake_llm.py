@@ -0,0 +1,150 @@
+"""
+Deterministic stand-in for AzureChatOpenAI.
+
+Answers extraction prompts with a well-formed invoice and coding prompts
+(single or batched) with a GL coding, after a configurable simulated latency. Responses report
+token usage the way Azure OpenAI does, so token accounting is exercised too;
+streamed answers arrive in small chunks with the latency spread over them,
+and their usage comes with the last chunk.
+"""
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Iterator, List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.pydantic_v1 import PrivateAttr
+
+BATCH_PATTERN = re.compile(r"to each of these (\d+) invoices")
+
+# Characters per chunk of a streamed answer
+STREAM_CHUNK_CHARS = 16
+
+
+class FakeAzureChatOpenAI(BaseChatModel):
+    """Chat model returning canned invoice extraction and coding answers."""
+
+    latency: float = 0.2  # Seconds per call
+    jitter: float = 0.0  # Up to this fraction of `latency` added or removed
+    seed: int = 0
+    deployment_name: str = "fake-benchmark"
+
+    _counter: Any = PrivateAttr()
+    _rng: Any = PrivateAttr()
+    _lock: Any = PrivateAttr()
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._counter = itertools.count(1)
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-azure-openai"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        content, latency = self._answer(prompt)
+        time.sleep(latency)
+
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=content))],
+            llm_output={
+                "token_usage": self._usage(prompt, content),
+                "model_name": self.deployment_name,
+            },
+        )
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        content, latency = self._answer(prompt)
+
+        # Spread the latency over the chunks, as a streamed answer would arrive
+        chunks = [content[start:start + STREAM_CHUNK_CHARS] for start in range(0, len(content), STREAM_CHUNK_CHARS)]
+        for text in chunks:
+            time.sleep(latency / len(chunks))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+        # Usage arrives with the last chunk of the stream
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            additional_kwargs={"token_usage": self._usage(prompt, content)},
+        ))
+
+    @staticmethod
+    def _usage(prompt: str, content: str) -> dict:
+        """Token usage the way Azure OpenAI reports it."""
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _answer(self, prompt: str) -> Tuple[str, float]:
+        """Return the canned answer to a prompt and its simulated latency."""
+        with self._lock:
+            sequence = next(self._counter)
+            factor = 1 + self._rng.uniform(-self.jitter, self.jitter)
+        latency = max(self.latency * factor, 0)
+
+        batch = BATCH_PATTERN.search(prompt)
+        if "Extract data from this invoice" in prompt:
+            content = json.dumps(self._invoice(sequence))
+        elif batch:
+            content = json.dumps({"codings": [
+                {"invoice": number, "gl_account": "5000", "cost_center": "CC-100"}
+                for number in range(1, int(batch.group(1)) + 1)
+            ]})
+        else:
+            content = json.dumps({
+                "gl_account": "5000",
+                "cost_center": "CC-100",
+                "confidence": 0.95,
+                "reasoning": "IT services",
+            })
+
+        return content, latency
+
+    @staticmethod
+    def _invoice(sequence: int) -> dict:
+        """A valid invoice with a unique number, so no two are duplicates."""
+        net_amount = 100.0 + sequence % 900
+        tax_amount = round(net_amount * 0.1, 2)
+        return {
+            "invoice_number": f"BENCH-{sequence:08d}",
+            "supplier_name": f"Benchmark Supplier {sequence % 50}",
+            "supplier_tax_id": f"BM-{sequence % 50:04d}",
+            "invoice_date": "2024-01-15",
+            "due_date": "2024-02-15",
+            "total_amount": net_amount + tax_amount,
+            "tax_amount": tax_amount,
+            "net_amount": net_amount,
+            "currency": "USD",
+            "po_number": f"PO-{sequence:06d}",
+            "line_items": [{
+                "description": "Cloud Services - Monthly Subscription",
+                "quantity": 1,
+                "unit_price": net_amount,
+                "total": net_amount,
+            }],
+        }
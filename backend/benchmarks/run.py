@@ -0,0 +1,337 @@
+"""
+Offline throughput benchmarks for the invoice pipeline.
+
+Runs the processing pipeline, the upload endpoint and the statistics
+endpoints against FakeAzureChatOpenAI and a throwaway SQLite database, and
+reports throughput, latency percentiles and memory per concurrency level.
+
+Usage (from the backend directory):
+    python -m benchmarks.run --concurrency 1 4 16 --invoices 200 --latency-ms 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+SCENARIOS = ("pipeline", "upload", "stats")
+AUTH_HEADERS = {"Authorization": "Bearer mock-token-admin"}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--invoices", type=int, default=100, help="Invoices per concurrency level")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Simulated latency per LLM call")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Latency jitter as a fraction of latency")
+    parser.add_argument("--stats-rows", type=int, default=10000, help="Invoices seeded for the stats scenario")
+    parser.add_argument("--stats-requests", type=int, default=500, help="Requests per stats endpoint and level")
+    parser.add_argument("--with-caches", action="store_true", help="Keep LLM, result and coding caches enabled")
+    parser.add_argument("--tracemalloc", action="store_true", help="Report Python heap peaks (slows the run)")
+    parser.add_argument("--database-url", help="Database to benchmark against (default: throwaway SQLite)")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+    return parser.parse_args()
+
+
+def configure_environment(args: argparse.Namespace, workdir: str) -> None:
+    """Point the application at throwaway storage before it is imported."""
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/benchmark.db"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:9")
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["LLM_CACHE_PATH"] = os.path.join(workdir, "llm_cache.sqlite3")
+    os.environ["INVOICE_WORKERS"] = str(max(args.concurrency))
+    os.environ["INVOICE_QUEUE_SIZE"] = str(max(args.concurrency) * 4)
+
+    if not args.with_caches:
+        for flag in ("LLM_CACHE_ENABLED", "RESULT_CACHE_ENABLED", "CODING_INDEX_ENABLED"):
+            os.environ[flag] = "false"
+
+
+def summarize(latencies: List[float], wall_seconds: float, operations: int) -> Dict[str, Any]:
+    """Throughput, latency percentiles and memory for one run."""
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+
+    result = {
+        "operations": operations,
+        "per_second": round(operations / wall_seconds, 2) if wall_seconds else 0.0,
+        "p50_ms": round(p50 * 1000, 1),
+        "p95_ms": round(p95 * 1000, 1),
+        "p99_ms": round(p99 * 1000, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if tracemalloc.is_tracing():
+        result["heap_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        tracemalloc.reset_peak()
+    return result
+
+
+def _pdf_text(line: str) -> str:
+    """Escape a line for a PDF string literal."""
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_invoice_pdf(path: str, lines: List[str]) -> None:
+    """Write a single-page PDF whose text layer holds `lines`."""
+    from pypdf import PdfWriter
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    writer = PdfWriter()
+    page = writer.add_blank_page(612, 792)
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    page[NameObject("/Resources")] = DictionaryObject({
+        NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)})
+    })
+
+    content = DecodedStreamObject()
+    operators = ["BT", "/F1 10 Tf", "14 TL", "50 740 Td"]
+    operators += [f"({_pdf_text(line)}) Tj T*" for line in lines]
+    operators.append("ET")
+    content.set_data("\n".join(operators).encode("latin-1"))
+    page[NameObject("/Contents")] = writer._add_object(content)
+
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def write_documents(directory: str, prefix: str, count: int) -> List[str]:
+    """Create `count` distinct invoice PDFs so none is served as a duplicate."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"{prefix}-{index:06d}.pdf")
+        net_amount = 100.0 + index % 900
+        write_invoice_pdf(path, [
+            "INVOICE",
+            f"Invoice Number: {prefix.upper()}-{index:06d}",
+            "Invoice Date: 2024-01-15    Due Date: 2024-02-15",
+            f"Supplier: Benchmark Supplier {index % 50}    Tax ID: BM-{index % 50:04d}",
+            f"Purchase Order: PO-{index:06d}",
+            "",
+            f"1  Cloud Services - Monthly Subscription  1 x {net_amount:.2f}  {net_amount:.2f}",
+            "",
+            f"Subtotal: {net_amount:.2f} USD",
+            f"Tax (10%): {net_amount * 0.1:.2f} USD",
+            f"Total: {net_amount * 1.1:.2f} USD",
+            "",
+            "Terms and Conditions",
+            "Payment is due within 30 days of the invoice date.",
+        ])
+        paths.append(path)
+    return paths
+
+
+def bench_pipeline(processor: Any, concurrency: int, count: int, workdir: str) -> Dict[str, Any]:
+    """Call InvoiceProcessor.process_invoice from `concurrency` threads."""
+    paths = write_documents(os.path.join(workdir, "pipeline"), f"c{concurrency}", count)
+
+    def process(path: str) -> float:
+        start = time.perf_counter()
+        result = processor.process_invoice(path, "pdf")
+        if result["processing_errors"]:
+            raise RuntimeError(result["processing_errors"])
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(process, paths))
+    return summarize(latencies, time.perf_counter() - start, count)
+
+
+async def _run_concurrently(operation: Callable, items: List[Any], concurrency: int) -> List[float]:
+    """Run `operation` on every item with at most `concurrency` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(item: Any) -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            await operation(item)
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*(timed(item) for item in items))
+
+
+async def bench_upload(client: Any, concurrency: int, count: int, workdir: str) -> Dict[str, Any]:
+    """Upload documents and poll their jobs until processed."""
+    paths = write_documents(os.path.join(workdir, "upload"), f"c{concurrency}", count)
+
+    async def upload(path: str) -> None:
+        with open(path, "rb") as f:
+            response = await client.post(
+                "/api/v1/invoices/upload",
+                files={"file": (os.path.basename(path), f.read(), "application/pdf")},
+                headers=AUTH_HEADERS,
+            )
+        response.raise_for_status()
+        job_url = response.headers["Location"]
+
+        while True:
+            job = (await client.get(job_url, headers=AUTH_HEADERS)).json()
+            if job["status"] == "completed":
+                return
+            if job["status"] == "failed":
+                raise RuntimeError(job["error"])
+            await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    latencies = await _run_concurrently(upload, paths, concurrency)
+    return summarize(latencies, time.perf_counter() - start, count)
+
+
+async def bench_stats(client: Any, concurrency: int, requests: int) -> Dict[str, Dict[str, Any]]:
+    """Poll the statistics endpoints like dashboard clients do."""
+    results = {}
+    endpoints = {
+        "overview": "/api/v1/invoices/stats/overview",
+        "dashboard": "/api/v1/invoices/dashboard/metrics",
+    }
+    for name, path in endpoints.items():
+        async def fetch(_: int) -> None:
+            response = await client.get(path, headers=AUTH_HEADERS)
+            response.raise_for_status()
+
+        start = time.perf_counter()
+        latencies = await _run_concurrently(fetch, list(range(requests)), concurrency)
+        results[name] = summarize(latencies, time.perf_counter() - start, requests)
+    return results
+
+
+def seed_invoices(rows: int) -> None:
+    """Bulk insert invoices for the stats scenario and rebuild the counters."""
+    from datetime import datetime, timedelta
+
+    from app.db.session import SessionLocal
+    from app.models.invoice import Invoice
+    from app.services.invoice_stats import rebuild_invoice_counters
+
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        statuses = ("pending", "approved", "rejected")
+        db.bulk_insert_mappings(Invoice, [
+            {
+                "invoice_number": f"SEED-{index:08d}",
+                "supplier_id": 1,
+                "invoice_date": now - timedelta(days=index % 90),
+                "due_date": now + timedelta(days=30),
+                "total_amount": 110.0,
+                "tax_amount": 10.0,
+                "net_amount": 100.0,
+                "status": statuses[index % 3],
+                "processing_status": "completed",
+                "is_touchless": index % 2 == 0,
+                "processing_time": 1.0 + index % 5,
+                "created_at": now - timedelta(days=index % 90),
+            }
+            for index in range(rows)
+        ])
+        db.commit()
+        rebuild_invoice_counters(db)
+    finally:
+        db.close()
+
+
+async def run(args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    import httpx
+
+    from app.agents.invoice_processor import InvoiceProcessor
+    from app.agents.pipeline import use_invoice_processor
+    from app.db.init_db import init_db
+    from app.db.session import SessionLocal, async_engine
+    from app.main import app
+    from benchmarks.fake_llm import FakeAzureChatOpenAI
+
+    llm = FakeAzureChatOpenAI(latency=args.latency_ms / 1000, jitter=args.jitter)
+    processor = InvoiceProcessor(llm=llm)
+    use_invoice_processor(processor)
+
+    await app.router.startup()
+    db = SessionLocal()
+    try:
+        init_db(db)
+    finally:
+        db.close()
+
+    results: Dict[str, Any] = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("json_path", "database_url")}
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        if "pipeline" in args.scenarios:
+            results["pipeline"] = {}
+            for concurrency in args.concurrency:
+                results["pipeline"][concurrency] = await asyncio.to_thread(
+                    bench_pipeline, processor, concurrency, args.invoices, workdir
+                )
+
+        if "upload" in args.scenarios:
+            results["upload"] = {}
+            for concurrency in args.concurrency:
+                results["upload"][concurrency] = await bench_upload(client, concurrency, args.invoices, workdir)
+
+        if "stats" in args.scenarios:
+            await asyncio.to_thread(seed_invoices, args.stats_rows)
+            results["stats"] = {}
+            for concurrency in args.concurrency:
+                results["stats"][concurrency] = await bench_stats(client, concurrency, args.stats_requests)
+
+    await app.router.shutdown()
+    await async_engine.dispose()
+    return results
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    header = f"{'scenario':<28}{'conc':>6}{'ops':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+
+    def row(name: str, concurrency: Any, result: Dict[str, Any]) -> None:
+        print(
+            f"{name:<28}{concurrency:>6}{result['operations']:>8}{result['per_second']:>10}"
+            f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}{result['peak_rss_mb']:>9}"
+        )
+
+    for scenario in ("pipeline", "upload"):
+        for concurrency, result in results.get(scenario, {}).items():
+            row(scenario, concurrency, result)
+    for concurrency, endpoints in results.get("stats", {}).items():
+        for endpoint, result in endpoints.items():
+            row(f"stats {endpoint}", concurrency, result)
+
+
+def main() -> None:
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="perfo-bench-") as workdir:
+        configure_environment(args, workdir)
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        if args.tracemalloc:
+            tracemalloc.start()
+
+        results = asyncio.run(run(args, workdir))
+
+    print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
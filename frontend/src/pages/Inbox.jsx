@@ -76,6 +76,18 @@ const InvoiceCard = ({ invoice, onClick }) => (
   </div>
 );
 
+const JOB_POLL_INTERVAL_MS = 1000;
+
+const waitForJob = async (jobId) => {
+  for (;;) {
+    const { data: job } = await invoicesAPI.getJob(jobId);
+    if (job.status === 'completed' || job.status === 'failed') {
+      return job;
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+};
+
 export default function Inbox() {
   const [invoices, setInvoices] = useState([]);
   const [loading, setLoading] = useState(false);
@@ -105,9 +117,14 @@ export default function Inbox() {
 
     try {
       setUploading(true);
-      await invoicesAPI.upload(file);
+      const { data: job } = await invoicesAPI.upload(file);
+      const result = await waitForJob(job.job_id);
       await loadInvoices();
-      alert('Invoice uploaded and processed successfully!');
+      if (result.status === 'failed') {
+        alert(`Invoice processing failed: ${result.error}`);
+      } else {
+        alert('Invoice uploaded and processed successfully!');
+      }
     } catch (error) {
       console.error('Upload failed:', error);
       alert('Failed to upload invoice');
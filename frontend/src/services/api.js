@@ -67,6 +67,9 @@ export const invoicesAPI = {
     });
   },
 
+  getJob: (jobId) =>
+    api.get(`/api/v1/invoices/jobs/${jobId}`),
+
   update: (id, data) =>
     api.put(`/api/v1/invoices/${id}`, data),
 